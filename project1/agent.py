@@ -3,8 +3,9 @@ from typing import Iterable
 import numpy as np
 from math import factorial
 
+import bitmask
+from enumeration import ClauseEnumerator
 from tutorial3 import Disjunction
-from itertools import combinations, chain
 
 
 def cnk(n, k):
@@ -13,20 +14,20 @@ def cnk(n, k):
 
 VERBOSE = False
 
+# upper bound on the number of (clause, interpretation, word) triples evaluated in one vectorized step
+CHUNK_ELEMENTS = 1 << 22
+
 
 class Hypothesis:
     def __init__(self, n_variables, s):
-        self.clauses = self.generate_all_disjunctions(n_variables, s)
+        self.n_variables = n_variables
+        self.enumerator = ClauseEnumerator(n_variables, s)
+        # one row per clause, bit i of the row is set iff the clause contains the literal of variable i;
+        # None until the first elimination, meaning that all clauses of the enumerator are still present
+        self.positive_literals = None
+        self.negative_literals = None
         self.incorrect_clauses = None
 
-    @staticmethod
-    def set_cuts(l):
-        source_set = set(l)
-        subsets = []
-        for subset in chain.from_iterable(combinations(l, n) for n in range(len(l) + 1)):
-            subsets.append((list(source_set.difference(subset)), list(subset)))
-        return subsets
-
     # Version 1: too many clauses generated (redundant)
     # @staticmethod
     # def generate_all_disjunctions(n_variables, s) -> Iterable[Disjunction]:
@@ -45,43 +46,154 @@ class Hypothesis:
 
     @staticmethod
     def generate_all_disjunctions(n_variables, s) -> Iterable[Disjunction]:
-        disjunctions = set()
+        return iter(ClauseEnumerator(n_variables, s))
 
-        for i in range(1, s + 1):
-            literal_combinations = combinations(range(n_variables), i)
-            literal_divisions = Hypothesis.set_cuts(range(i))
+    @property
+    def materialized(self):
+        return self.positive_literals is not None
 
-            for chosen_literals_indices in literal_combinations:
-                chosen_literals_indices = np.array(chosen_literals_indices)
+    @property
+    def clauses(self) -> Iterable[Disjunction]:
+        if not self.materialized:
+            return iter(self.enumerator)
+        positive_literals = bitmask.unpack(self.positive_literals, self.n_variables)
+        negative_literals = bitmask.unpack(self.negative_literals, self.n_variables)
+        return [Disjunction(p, n) for p, n in zip(positive_literals, negative_literals)]
 
-                for positive_indices, negative_indices in literal_divisions:
-                    positive_literals = np.zeros(n_variables, dtype=np.bool)
-                    negative_literals = np.zeros(n_variables, dtype=np.bool)
+    def chunk_size(self, n_words=None):
+        if n_words is None:
+            n_words = self.positive_literals.size if self.materialized else 0
+        return max(1, CHUNK_ELEMENTS // max(1, n_words))
 
-                    positive_literals[chosen_literals_indices[positive_indices]] = True
-                    negative_literals[chosen_literals_indices[negative_indices]] = True
+    def eliminate(self, packed_interpretations):
+        """
+        Keep only the clauses satisfied by all of the packed interpretations.
+        The first elimination streams the enumerator so that only the surviving clauses are ever stored.
+        """
+        if self.materialized:
+            blocks = [(self.positive_literals, self.negative_literals)]
+        else:
+            blocks = self.enumerator.blocks(self.chunk_size(bitmask.n_words(self.n_variables)))
 
-                    disjunctions.add(Disjunction(positive_literals, negative_literals))
+        positive_blocks, negative_blocks = [], []
+        for positive_literals, negative_literals in blocks:
+            start, size = 0, 1
+            while start < len(packed_interpretations) and len(positive_literals):
+                # grow the chunks geometrically, the first interpretations already eliminate most clauses
+                stop = start + min(size, max(1, CHUNK_ELEMENTS // positive_literals.size))
+                satisfied = bitmask.satisfied_matrix(
+                    positive_literals, negative_literals, packed_interpretations[start:stop])
+                satisfied = np.all(satisfied, axis=1)
+                positive_literals = positive_literals[satisfied]
+                negative_literals = negative_literals[satisfied]
+                start, size = stop, 2 * size
+            positive_blocks.append(positive_literals)
+            negative_blocks.append(negative_literals)
 
-        return disjunctions
+        if positive_blocks:
+            self.positive_literals = np.concatenate(positive_blocks)
+            self.negative_literals = np.concatenate(negative_blocks)
+        else:
+            self.positive_literals = np.zeros((0, bitmask.n_words(self.n_variables)), dtype=np.uint64)
+            self.negative_literals = self.positive_literals.copy()
 
     def update(self, interpretation):
-        self.clauses = set(filter(lambda c: c.evaluate(interpretation), self.clauses))
+        self.eliminate(bitmask.pack(interpretation))
+
+    def update_batch(self, interpretations):
+        """
+        Eliminate every clause violated by any of the given (positive) interpretations.
+
+        :param interpretations: Matrix of shape (m, n_variables).
+        :type interpretations: np.array[bool]
+        """
+        # duplicate rows eliminate the same clauses, for small n there are only 2^n distinct ones
+        self.eliminate(np.unique(bitmask.pack(interpretations), axis=0))
+
+    def update_sequence(self, interpretations):
+        """
+        Like update_batch, but also tells which of the interpretations, taken in order, changed the hypothesis.
+
+        :param interpretations: Matrix of shape (m, n_variables).
+        :type interpretations: np.array[bool]
+        :return: Indices of the interpretations which eliminated at least one clause.
+        :rtype: np.array[int]
+        """
+        if not len(interpretations):
+            return np.zeros(0, dtype=int)
+        eliminating = []
+        if not self.materialized:
+            # the first interpretation always eliminates, e.g. the unit clauses it falsifies
+            self.update(interpretations[:1])
+            eliminating, interpretations = [0], interpretations[1:]
+            offset = 1
+        else:
+            offset = 0
+
+        packed = bitmask.pack(interpretations)
+        chunk_size = self.chunk_size()
+        for start in range(0, len(packed), chunk_size):
+            violated = ~bitmask.satisfied_matrix(
+                self.positive_literals, self.negative_literals, packed[start:start + chunk_size])
+            eliminated = np.any(violated, axis=1)
+            # a clause is eliminated by the first interpretation violating it
+            first_violating = np.argmax(violated[eliminated], axis=1)
+            eliminating.extend(np.unique(first_violating) + start + offset)
+
+            self.positive_literals = self.positive_literals[~eliminated]
+            self.negative_literals = self.negative_literals[~eliminated]
+        return np.array(eliminating, dtype=int)
 
     def evaluate(self, interpretation):
-        for clause in self.clauses:
-            if not clause.evaluate(interpretation):
-                return False
-        return True
+        if not self.materialized:
+            # all clauses together contain both x and ~x for some variable x, unless there are none at all
+            return len(self.enumerator) == 0
+        satisfied = bitmask.satisfied_clauses(
+            self.positive_literals, self.negative_literals, bitmask.pack(interpretation))
+        return bool(np.all(satisfied))
+
+    def evaluate_batch(self, interpretations):
+        """
+        Evaluate the hypothesis on every row of the interpretation matrix.
+
+        :param interpretations: Matrix of shape (m, n_variables).
+        :type interpretations: np.array[bool]
+        :return: Vector of m predictions.
+        :rtype: np.array[bool]
+        """
+        if not self.materialized:
+            return np.full(len(interpretations), len(self.enumerator) == 0)
+
+        packed = bitmask.pack(interpretations)
+        predictions = np.empty(len(packed), dtype=bool)
+        chunk_size = self.chunk_size()
+        for start in range(0, len(packed), chunk_size):
+            satisfied = bitmask.satisfied_matrix(
+                self.positive_literals, self.negative_literals, packed[start:start + chunk_size])
+            predictions[start:start + chunk_size] = np.all(satisfied, axis=0)
+        return predictions
+
+    def __len__(self):
+        if not self.materialized:
+            return len(self.enumerator)
+        return len(self.positive_literals)
 
     def __str__(self):
         return " & ".join("(%s)" % str(clause) for clause in self.clauses)
 
 
 class Agent:
-    def __init__(self, epsilon, delta):
+    def __init__(self, epsilon, delta, patience=None):
+        """
+        :param patience: If set, training stops once that many consecutive training samples have not eliminated any
+                         clause (adaptive mode) instead of consuming the whole worst-case PAC sample.
+        :type patience: int
+        """
         self.epsilon = epsilon
         self.delta = delta
+        self.patience = patience
+        # filled in by the adaptive mode: training samples used, hypothesis changes and the implied delta
+        self.stopping_report = None
 
         # init in constructor
         self.previous_interpretation = None
@@ -100,6 +212,64 @@ class Agent:
         )
         return m
 
+    def reset(self, n_variables, s):
+        self.n_variables, self.s = n_variables, s
+        self.hypothesis = Hypothesis(self.n_variables, self.s)
+
+    def fit(self, interpretations, labels):
+        """
+        Batch counterpart of predict: learn from a whole labelled dataset at once,
+        e.g. the output of CNF.generate_training_dataset. Call reset first.
+
+        :param interpretations: Matrix of shape (m, n_variables).
+        :type interpretations: np.array[bool]
+        :param labels: Vector of m classification labels.
+        :type labels: np.array[bool]
+        """
+        interpretations = np.asarray(interpretations, dtype=bool)
+        labels = np.asarray(labels, dtype=bool)
+        self.hypothesis.update_batch(interpretations[labels])
+        return self
+
+    def fit_adaptive(self, oracle_session):
+        """
+        Requests training data from the oracle only until `patience` consecutive samples eliminate no clause.
+        With a lazy session (request_dataset(m, lazy=True)) the oracle generates only the blocks handed out here.
+
+        If the hypothesis had error at least epsilon, each sample would eliminate a clause with probability at least
+        epsilon, so a quiet window of w samples has probability at most (1 - epsilon)^w. With a union bound over the
+        k + 1 hypotheses visited after k changes, the stopped hypothesis is epsilon-good with probability at least
+        1 - implied_delta, where implied_delta = (k + 1) (1 - epsilon)^w.
+        """
+        quiet = used = changes = 0
+        while quiet < self.patience:
+            interpretations, labels = oracle_session.request_training_block(self.patience - quiet)
+            if not len(labels):
+                break
+
+            positives = np.flatnonzero(labels)
+            eliminating = positives[self.hypothesis.update_sequence(interpretations[positives])]
+            if len(eliminating):
+                quiet = len(labels) - eliminating[-1] - 1
+                changes += len(eliminating)
+            else:
+                quiet += len(labels)
+            used += len(labels)
+
+        self.stopping_report = {
+            "samples": used,
+            "changes": changes,
+            "quiet": quiet,
+            "implied_delta": min(1.0, (changes + 1) * (1 - self.epsilon) ** quiet),
+        }
+        if VERBOSE:
+            print("Stopped after %(samples)d samples, %(changes)d changes, implied delta %(implied_delta).4f"
+                  % self.stopping_report)
+        return self
+
+    def predict_batch(self, interpretations):
+        return self.hypothesis.evaluate_batch(np.asarray(interpretations, dtype=bool))
+
     def process_first_observation(self, interpretation):
         self.previous_interpretation = interpretation
         self.previous_estimate = self.hypothesis.evaluate(interpretation)
@@ -113,12 +283,25 @@ class Agent:
         self.previous_estimate = self.hypothesis.evaluate(interpretation)
         return self.previous_estimate
 
-    def interact_with_oracle(self, oracle_session):
-        self.n_variables, self.s = oracle_session.request_parameters()
-        self.hypothesis = Hypothesis(self.n_variables, self.s)
+    def interact_with_oracle(self, oracle_session, batch=False):
+        self.reset(*oracle_session.request_parameters())
 
         m = self.compute_required_training_dataset_size()
+
+        if self.patience is not None:
+            # adaptive stopping needs the bulk protocol, the oracle generates only the samples that are handed out
+            oracle_session.request_dataset(m, lazy=True)
+            self.fit_adaptive(oracle_session)
+            oracle_session.submit_predictions(self.predict_batch(oracle_session.request_test_block()))
+            return
+
         first_sample = oracle_session.request_dataset(m)
+
+        if batch:
+            self.fit(*oracle_session.request_training_block())
+            oracle_session.submit_predictions(self.predict_batch(oracle_session.request_test_block()))
+            return
+
         first_sample = first_sample.reshape((1, -1))
         prediction = self.process_first_observation(first_sample)
 
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+"""
+Benchmark of the PAC k-CNF learner.
+
+Sweeps n_variables, s, epsilon and delta and for every combination measures the stages of the learner:
+the required training dataset size, Hypothesis construction, online update/evaluate and their batch variants.
+Each record holds wall time, peak traced memory and samples/sec; all records are written as JSON.
+Before the sweep the DPLL consistency checker is cross-checked against resolution on random clause sets.
+
+Example:
+    python benchmark.py --n-variables 5 10 20 --s 2 3 --output benchmark.json
+"""
+import json
+import random
+import tracemalloc
+from argparse import ArgumentParser
+from itertools import product
+from time import perf_counter
+
+import numpy as np
+from agent import Agent, Hypothesis
+from cnf import CNF
+from resolution import ResolutionEngine
+from sat import DPLLSolver
+
+
+def measure(setup, action, trace_memory=True):
+    """
+    Times action(setup()), optionally measures its peak traced memory in a second run on a fresh setup.
+
+    :return: Wall time in seconds and peak memory in bytes (None if not traced).
+    """
+    state = setup()
+    start = perf_counter()
+    action(state)
+    seconds = perf_counter() - start
+
+    peak = None
+    if trace_memory:
+        state = setup()
+        tracemalloc.start()
+        action(state)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def learned_hypothesis(n_variables, s, interpretations, labels):
+    hypothesis = Hypothesis(n_variables, s)
+    hypothesis.update_batch(interpretations[labels])
+    return hypothesis
+
+
+def update_online(hypothesis, interpretations, labels):
+    for interpretation, label in zip(interpretations, labels):
+        if label:
+            hypothesis.update(interpretation.reshape((1, -1)))
+
+
+def evaluate_online(hypothesis, interpretations):
+    for interpretation in interpretations:
+        hypothesis.evaluate(interpretation.reshape((1, -1)))
+
+
+def benchmark(n_variables, s, epsilon, delta, max_samples, trace_memory=True, seed=0):
+    """ Measures all stages of the learner for a single parameter combination. """
+    np.random.seed(seed)
+    agent = Agent(epsilon, delta)
+    agent.n_variables, agent.s = n_variables, s
+
+    seconds, peak = measure(lambda: agent, Agent.compute_required_training_dataset_size, trace_memory)
+    m = agent.compute_required_training_dataset_size()
+    stages = [("sample_size", 1, seconds, peak)]
+
+    target = CNF.random(n_variables, s)
+    interpretations, labels = target.generate_training_dataset(min(m, max_samples))
+    n_samples = len(labels)
+
+    def fresh():
+        return Hypothesis(n_variables, s)
+
+    def learned():
+        return learned_hypothesis(n_variables, s, interpretations, labels)
+
+    runs = [
+        ("construction", 1, lambda: None, lambda _: fresh()),
+        ("update", n_samples, fresh, lambda h: update_online(h, interpretations, labels)),
+        ("update_batch", n_samples, fresh, lambda h: h.update_batch(interpretations[labels])),
+        ("evaluate", n_samples, learned, lambda h: evaluate_online(h, interpretations)),
+        ("evaluate_batch", n_samples, learned, lambda h: h.evaluate_batch(interpretations)),
+    ]
+    for stage, samples, setup, action in runs:
+        seconds, peak = measure(setup, action, trace_memory)
+        stages.append((stage, samples, seconds, peak))
+
+    n_clauses = len(learned())
+    return [{
+        "stage": stage,
+        "n_variables": n_variables,
+        "s": s,
+        "epsilon": epsilon,
+        "delta": delta,
+        "required_samples": m,
+        "samples": samples,
+        "clauses": n_clauses,
+        "seconds": seconds,
+        "samples_per_second": samples / seconds if seconds > 0 else float("inf"),
+        "peak_bytes": peak,
+    } for stage, samples, seconds, peak in stages]
+
+
+def cross_check(n_variables, clauses):
+    """
+    Adds the clauses to a DPLLSolver and a ResolutionEngine and raises AssertionError at the first clause they
+    decide differently.
+    """
+    dpll, resolution = DPLLSolver(n_variables), ResolutionEngine(n_variables)
+    for clause in clauses:
+        consistent = dpll.is_consistent_with(clause)
+        if consistent != resolution.is_consistent_with(clause):
+            raise AssertionError("DPLL and resolution disagree on clause %s" % (clause,))
+        if dpll.add(clause) != resolution.add(clause):
+            raise AssertionError("DPLL and resolution disagree on adding clause %s" % (clause,))
+
+
+def random_clause(n_variables, size, rng):
+    variables = rng.sample(range(n_variables), size)
+    signs = [rng.random() < 0.5 for _ in variables]
+    positive_mask = sum(1 << v for v, sign in zip(variables, signs) if sign)
+    negative_mask = sum(1 << v for v, sign in zip(variables, signs) if not sign)
+    return positive_mask, negative_mask
+
+
+def check_consistency_checkers(n_sets=500, seed=0):
+    """ Cross-checks DPLLSolver against ResolutionEngine on fixed cases and n_sets random clause sets. """
+    # tautologies, x or not x, must neither be refused nor poison later clauses
+    cross_check(2, [(1, 1), (1, 0), (0, 2), (3, 3), (2, 0)])
+    cross_check(3, [(1, 0), (1, 1), (0, 1)])
+
+    rng = random.Random(seed)
+    for _ in range(n_sets):
+        n_variables = rng.randint(2, 6)
+        clauses = [random_clause(n_variables, rng.randint(1, min(3, n_variables)), rng) for _ in range(12)]
+        # tautologies are never generated by CNF.random, mix some in
+        clauses += [(1 << v, 1 << v) for v in rng.sample(range(n_variables), 2)]
+        rng.shuffle(clauses)
+        cross_check(n_variables, clauses)
+    print("DPLL and resolution agree on %d random clause sets." % n_sets)
+
+
+def run_benchmark(n_variables, s, epsilon, delta, max_samples, trace_memory=True, seed=0):
+    results = []
+    for n, k, eps, dlt in product(n_variables, s, epsilon, delta):
+        for record in benchmark(n, k, eps, dlt, max_samples, trace_memory, seed):
+            print("n=%(n_variables)3d s=%(s)d eps=%(epsilon).3f delta=%(delta).3f %(stage)-14s "
+                  "%(seconds)10.4fs %(samples_per_second)14.1f samples/s" % record)
+            results.append(record)
+    return results
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark of the PAC k-CNF learner.")
+    parser.add_argument("--n-variables", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--s", type=int, nargs="+", default=[2, 3])
+    parser.add_argument("--epsilon", type=float, nargs="+", default=[0.05, 0.1])
+    parser.add_argument("--delta", type=float, nargs="+", default=[0.05, 0.1])
+    parser.add_argument("--max-samples", type=int, default=10000,
+                        help="cap on the number of samples used by the update and evaluate stages")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced run measuring peak memory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check-sets", type=int, default=500,
+                        help="random clause sets of the DPLL/resolution cross-check, 0 skips it")
+    parser.add_argument("--output", default="benchmark.json")
+    arguments = parser.parse_args()
+
+    if arguments.check_sets:
+        check_consistency_checkers(arguments.check_sets, arguments.seed)
+    records = run_benchmark(arguments.n_variables, arguments.s, arguments.epsilon, arguments.delta,
+                            arguments.max_samples, not arguments.no_memory, arguments.seed)
+    with open(arguments.output, "w") as output:
+        json.dump(records, output, indent=1)
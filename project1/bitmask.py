@@ -0,0 +1,68 @@
+import numpy as np
+
+WORD_SIZE = 64
+
+
+def n_words(n_variables):
+    """ Number of uint64 words needed to hold one bit per variable. """
+    return max(1, (n_variables + WORD_SIZE - 1) // WORD_SIZE)
+
+
+def pack(flags):
+    """
+    Pack rows of boolean flags into rows of uint64 words.
+    Variable i is stored in bit (i % 64) of word (i // 64), unused high bits are zero.
+
+    :param flags: Boolean matrix of shape (m, n) or a single vector of length n.
+    :type flags: np.array[bool]
+    :return: Packed matrix of shape (m, n_words(n)).
+    :rtype: np.array[np.uint64]
+    """
+    flags = np.atleast_2d(np.asarray(flags, dtype=bool))
+    m, n = flags.shape
+    padded = np.zeros((m, n_words(n) * WORD_SIZE), dtype=bool)
+    padded[:, :n] = flags
+    return np.packbits(padded, axis=1, bitorder='little').view('<u8').astype(np.uint64, copy=False)
+
+
+def unpack(words, n_variables):
+    """ Inverse of `pack`, returns a boolean matrix of shape (m, n_variables). """
+    words = np.ascontiguousarray(np.atleast_2d(words), dtype='<u8')
+    return np.unpackbits(words.view(np.uint8), axis=1, bitorder='little')[:, :n_variables].astype(bool)
+
+
+def satisfied_clauses(positive_literals, negative_literals, interpretation):
+    """
+    Evaluate all packed clauses against a single packed interpretation at once.
+
+    :param positive_literals: Packed positive literal masks, one row per clause.
+    :param negative_literals: Packed negative literal masks, one row per clause.
+    :param interpretation: Packed interpretation, a single row of words.
+    :return: Vector with True for every clause satisfied by the interpretation.
+    :rtype: np.array[bool]
+    """
+    interpretation = interpretation.reshape(1, -1)
+    return np.any((positive_literals & interpretation) | (negative_literals & ~interpretation), axis=1)
+
+
+def satisfied_matrix(positive_literals, negative_literals, interpretations):
+    """
+    Evaluate all packed clauses against many packed interpretations at once.
+
+    :return: Boolean matrix of shape (n_clauses, n_interpretations).
+    :rtype: np.array[bool]
+    """
+    positive_literals = positive_literals[:, None, :]
+    negative_literals = negative_literals[:, None, :]
+    interpretations = interpretations[None, :, :]
+    return np.any((positive_literals & interpretations) | (negative_literals & ~interpretations), axis=2)
+
+
+def to_int(flags):
+    """ Full-width integer bitmask of a boolean vector, bit i is set iff flags[i]. """
+    return int.from_bytes(np.packbits(np.asarray(flags, dtype=bool), bitorder='little').tobytes(), 'little')
+
+
+def from_int(mask, n_variables):
+    """ Inverse of `to_int`. """
+    return ((mask >> np.arange(n_variables, dtype=object)) & 1).astype(bool)
@@ -1,36 +1,43 @@
 from tutorial3 import Disjunction
+from resolution import ResolutionEngine
+from sat import DPLLSolver
 import numpy as np
 
+# consistency checkers of CNF, resolution saturation is kept as the reference implementation
+CHECKERS = {
+    "dpll": DPLLSolver,
+    "resolution": ResolutionEngine,
+}
+
 class CNF:
-    def __init__(self, n_variables, s, clauses):
+    def __init__(self, n_variables, s, clauses, checker="dpll"):
         self.clauses = clauses
         self.n_variables = n_variables
         self.s = s
 
-    def resolve(self, clause):
-        if not clause.is_satisfiable(): return False
+        if checker not in CHECKERS:
+            raise ValueError("Unknown consistency checker '%s', use one of %s." % (checker, sorted(CHECKERS)))
+        self.engine = CHECKERS[checker](n_variables)
+        for clause in clauses:
+            self.engine.add((clause.positive_mask, clause.negative_mask))
 
-        resolved = self.clauses.copy()
-        to_resolve = {clause}
+    def resolve(self, clause):
+        """
+        Returns True iff the CNF extended by the clause is still satisfiable, decided by the consistency checker.
+        The CNF itself is not modified.
+        """
+        return self.engine.is_consistent_with((clause.positive_mask, clause.negative_mask))
 
-        while to_resolve:
-            clause = to_resolve.pop()
-            if clause in resolved: continue
-    
-            for other in resolved:
-                for i, (a, b) in enumerate(zip(clause.positive_literals, other.negative_literals)):
-                    if a and b:
-                        resolvent = Disjunction(
-                                clause.positive_literals | other.positive_literals,
-                                clause.negative_literals | other.negative_literals,
-                                )
-                        resolvent.positive_literals[i] = resolvent.negative_literals[i] = False
-                        if not resolvent.is_satisfiable():
-                            return False
-                        if not resolvent.is_tautology():
-                            to_resolve.add(resolvent)
-            resolved.add(clause)
+    def add(self, clause):
+        """
+        Adds the clause to the CNF iff the CNF stays satisfiable.
 
+        :return: True iff the clause has been added.
+        :rtype: bool
+        """
+        if not self.engine.add((clause.positive_mask, clause.negative_mask)):
+            return False
+        self.clauses.add(clause)
         return True
 
     def evaluate(self, interpretations):
@@ -42,15 +49,14 @@ class CNF:
         return np.all(interpreted_clauses, axis = 0)
 
     @classmethod
-    def random(cls, n_variables, s):
+    def random(cls, n_variables, s, checker="dpll"):
         q = s / n_variables ** s
         n_clauses = 1 + np.random.binomial(n_variables ** s - 1, q)
-        cnf = cls(n_variables, s, set())
+        cnf = cls(n_variables, s, set(), checker=checker)
 
         for _ in range(n_clauses):
             clause = Disjunction.random(n_variables, s=s)
-            if cnf.resolve(clause):
-                cnf.clauses.add(clause)
+            cnf.add(clause)
 
         return cnf
         
@@ -0,0 +1,125 @@
+import numpy as np
+from math import comb
+
+import bitmask
+from tutorial3 import Disjunction
+
+
+class ClauseEnumerator:
+    """
+    Index-based enumeration of all clauses of 1..s literals over distinct variables.
+
+    Every clause has a rank in range(len(self)). Clauses are ordered by their size i first,
+    then by the rank of their set of variables in the combinatorial number system and finally by their signs:
+
+        rank = offset[i] + combination_rank * 2^i + sign_bits
+
+    where bit k of sign_bits is set iff the k-th (ascending) variable of the clause is negated.
+    No clause is stored, each one is built from its rank on demand.
+    """
+
+    def __init__(self, n_variables, s):
+        self.n_variables = n_variables
+        self.s = min(s, n_variables)
+
+        # offsets[i] is the rank of the first clause of size i
+        self.offsets = [0, 0]
+        for i in range(1, self.s + 1):
+            self.offsets.append(self.offsets[-1] + comb(n_variables, i) * 2 ** i)
+
+        # binomials[k][c] = C(c, k), used to unrank many combinations at once
+        self.binomials = np.array(
+            [[comb(c, k) for c in range(n_variables)] for k in range(self.s + 1)], dtype=np.int64).reshape(
+            self.s + 1, n_variables)
+
+    def __len__(self):
+        return self.offsets[-1]
+
+    def size_of(self, rank):
+        for i in range(1, self.s + 1):
+            if rank < self.offsets[i + 1]:
+                return i
+        raise IndexError("Clause rank %d out of range." % rank)
+
+    @staticmethod
+    def rank_combination(variables):
+        """ Rank of an ascending tuple of variable indices in the combinatorial number system. """
+        return sum(comb(c, k) for k, c in enumerate(variables, start=1))
+
+    @staticmethod
+    def unrank_combination(rank, k):
+        """ Inverse of rank_combination for combinations of size k. """
+        variables = []
+        for position in range(k, 0, -1):
+            c = position - 1
+            while comb(c + 1, position) <= rank:
+                c += 1
+            variables.append(c)
+            rank -= comb(c, position)
+        return tuple(reversed(variables))
+
+    def rank(self, variables, negated):
+        """
+        :param variables: Indices of the clause's variables.
+        :type variables: Iterable[int]
+        :param negated: For every variable, whether its literal is negative.
+        :type negated: Iterable[bool]
+        :rtype: int
+        """
+        literals = sorted(zip(variables, negated))
+        i = len(literals)
+        if not 1 <= i <= self.s:
+            raise ValueError("Clause must have between 1 and %d literals." % self.s)
+        combination_rank = self.rank_combination(v for v, _ in literals)
+        sign_bits = sum(1 << k for k, (_, n) in enumerate(literals) if n)
+        return self.offsets[i] + (combination_rank << i) + sign_bits
+
+    def unrank(self, rank):
+        """ Returns the variables and their negation flags of the clause with the given rank. """
+        i = self.size_of(rank)
+        combination_rank, sign_bits = divmod(rank - self.offsets[i], 2 ** i)
+        variables = self.unrank_combination(combination_rank, i)
+        return variables, tuple(bool(sign_bits >> k & 1) for k in range(i))
+
+    def disjunction(self, rank):
+        variables, negated = self.unrank(rank)
+        positive_mask = sum(1 << variable for variable, negative in zip(variables, negated) if not negative)
+        negative_mask = sum(1 << variable for variable, negative in zip(variables, negated) if negative)
+        return Disjunction.from_masks(self.n_variables, positive_mask, negative_mask)
+
+    def __iter__(self):
+        for rank in range(len(self)):
+            yield self.disjunction(rank)
+
+    def unrank_block(self, i, start, stop):
+        """
+        Vectorized unranking of the clauses of size i with ranks offset[i] + start ... offset[i] + stop - 1.
+
+        :return: Packed positive and negative literal masks, one row per clause.
+        """
+        ranks = np.arange(start, stop, dtype=np.int64)
+        combination_ranks, sign_bits = ranks >> i, ranks & (2 ** i - 1)
+
+        variables = np.empty((len(ranks), i), dtype=np.intp)
+        for position in range(i, 0, -1):
+            c = np.searchsorted(self.binomials[position], combination_ranks, side='right') - 1
+            variables[:, position - 1] = c
+            combination_ranks = combination_ranks - self.binomials[position][c]
+
+        negated = (sign_bits[:, None] >> np.arange(i)) & 1 == 1
+        rows = np.arange(len(ranks))[:, None]
+
+        positive_literals = np.zeros((len(ranks), self.n_variables), dtype=bool)
+        negative_literals = np.zeros((len(ranks), self.n_variables), dtype=bool)
+        positive_literals[rows, variables] = ~negated
+        negative_literals[rows, variables] = negated
+        return bitmask.pack(positive_literals), bitmask.pack(negative_literals)
+
+    def blocks(self, block_size):
+        """
+        Streams all clauses in rank order as packed blocks of at most block_size clauses.
+        """
+        for i in range(1, self.s + 1):
+            size = self.offsets[i + 1] - self.offsets[i]
+            for start in range(0, size, block_size):
+                yield self.unrank_block(i, start, min(start + block_size, size))
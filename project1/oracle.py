@@ -15,22 +15,42 @@ class OracleSession:
 
     def get_requested_dataset_size(self):
         return self.__m
+
+    def get_consumed_dataset_size(self):
+        """ Number of training samples handed out so far. """
+        return self.__j if self.__bulk else min(self.__i, self.__m)
     
-    def request_dataset(self, m):
+    def request_dataset(self, m, lazy=False):
+        """
+        Starts the session with m training samples followed by the test block and returns the first sample.
+
+        With lazy=True nothing is generated up front and None is returned, training samples are generated when
+        request_training_block hands them out and the test block when it is requested, so an agent that stops
+        early never pays for the rest of the m samples. Only the bulk protocol can be used then.
+        """
         if  m <= 0:
             raise ValueError("Requested dataset size must be positive.")
         if not isinstance(m, int):
             raise TypeError("Requested dataset size must be an integer.")
 
         self.__m = m
-        self.__interpretations, self.__evaluations = \
-                self.__cnf.generate_training_dataset(m + self.__TEST_SIZE)
-
+        self.__n_samples = m + self.__TEST_SIZE
+        self.__lazy = lazy
         self.__i = 0
+        self.__j = 0
+        self.__bulk = lazy
+        self.__test_interpretations = self.__test_evaluations = None
+        if lazy:
+            return None
+
+        self.__interpretations, self.__evaluations = \
+                self.__cnf.generate_training_dataset(self.__n_samples)
+        self.__test_interpretations = self.__interpretations[-self.__TEST_SIZE:]
+        self.__test_evaluations = self.__evaluations[-self.__TEST_SIZE:]
         return self.__interpretations[self.__i]
 
     def has_more_samples(self):
-        return (self.__i + 1) < len(self.__evaluations)
+        return (self.__i + 1) < self.__n_samples
 
     def predict(self, prediction):
         reward = int(prediction == self.__evaluations[self.__i])
@@ -46,6 +66,40 @@ class OracleSession:
 
         return sample, reward
 
+    # Bulk protocol: the training block is handed out as arrays with labels and the whole test block is predicted at
+    # once. Use it instead of predict, after request_dataset.
+
+    def request_training_block(self, size=None):
+        """
+        Returns the next `size` training interpretations and their labels, all remaining ones if size is None.
+
+        :rtype: 2-tuple: (matrix of interpretations, vector of classification labels)
+        """
+        self.__bulk = True
+        stop = self.__m if size is None else min(self.__m, self.__j + size)
+        start, self.__j = self.__j, stop
+        if self.__lazy:
+            return self.__cnf.generate_training_dataset(stop - start)
+        return self.__interpretations[start:stop], self.__evaluations[start:stop]
+
+    def request_test_block(self):
+        """ Returns the matrix of the test interpretations. """
+        if self.__test_interpretations is None:
+            self.__test_interpretations, self.__test_evaluations = \
+                    self.__cnf.generate_training_dataset(self.__TEST_SIZE)
+        return self.__test_interpretations
+
+    def submit_predictions(self, predictions):
+        """ Scores predictions of the whole test block and finishes the session. """
+        predictions = np.asarray(predictions, dtype=bool)
+        if predictions.shape != (self.__TEST_SIZE,):
+            raise ValueError("Expected %d predictions, got %s." % (self.__TEST_SIZE, predictions.shape))
+        if self.__test_evaluations is None:
+            raise RuntimeError("The test block has not been requested.")
+
+        self.__test_reward = int(np.count_nonzero(predictions == self.__test_evaluations))
+        self.__i = self.__n_samples - 1
+
     def was_successful(self, epsilon):
         assert not self.has_more_samples(), "Session has not finished!"
         acc = self.__test_reward / self.__TEST_SIZE
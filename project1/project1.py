@@ -1,50 +1,99 @@
 #!/usr/bin/env python
+import os
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from time import time
 
 import numpy as np
 from agent import Agent
 from oracle import OracleSession
 
+MIN_N_SESSIONS = 100
+CONVERGENCE_THRESHOLD = 1e-3
+# sessions handed out to every worker per round of the parallel runner
+SESSIONS_PER_WORKER = 4
 
-def run_project():
-    np.random.seed(0)
-    min_n_sessions = 100
-    convergence_threshold = 1e-3
+
+def report(s, delta):
+    print("Converged to success rate: %.2f%%" % (s * 100))
+    if s >= 1.0 - delta:
+        print("Project was successful.")
+    else:
+        print("Project was not successful.")
+
+
+def session_seed(seed, session):
+    """ Seed of the given session, it depends only on the base seed and the session number. """
+    return int(np.random.SeedSequence([seed, session]).generate_state(1)[0])
+
+
+def run_session(seed, epsilon, delta, batch=False, patience=None):
+    np.random.seed(seed)
+    oracle_session = OracleSession()
+    Agent(epsilon, delta, patience).interact_with_oracle(oracle_session, batch=batch)
+    return oracle_session.was_successful(epsilon), oracle_session.get_consumed_dataset_size()
+
+
+def run_project(n_workers=1, seed=0, batch=False, patience=None):
+    """
+    Runs independent sessions until the success rate converges. Every session is seeded by session_seed and the
+    results are merged in session order, one worker runs them in this process, more workers on a process pool.
+    The convergence criterion is applied after each session, so the outcome does not depend on the number of workers.
+
+    :param n_workers: Number of worker processes, all CPUs if None.
+    :type n_workers: int
+    :param batch: Use the bulk protocol of OracleSession.
+    :type batch: bool
+    :param patience: Adaptive stopping window of the agent, see Agent.
+    :type patience: int
+    """
+    np.random.seed(seed)
     epsilon = np.random.uniform(0.05, 0.1)
     delta = np.random.uniform(0.05, 0.10)
 
-    agent = Agent(epsilon, delta)
     n_sessions = successes = 0
+    converged = False
 
-    while n_sessions < min_n_sessions or \
-                    abs((successes / n_sessions) - last_success_rate) >= convergence_threshold:
-        print("-" * 64)
-
-        # I believe the following was mistakenly placed in a different line, thus I moved it where it belongs and
-        # added a feasibility check
-        last_success_rate = successes / n_sessions if n_sessions is not 0 else 0
-
-        oracle_session = OracleSession()
-        n_sessions += 1
-        agent.interact_with_oracle(oracle_session)
+    n_workers = n_workers or os.cpu_count()
+    round_size = n_workers * SESSIONS_PER_WORKER
+    # sessions of a round are computed lazily in process, so a single worker never runs past convergence
+    pool = ProcessPoolExecutor(n_workers) if n_workers > 1 else None
 
-        m = oracle_session.get_requested_dataset_size()
-        if oracle_session.was_successful(epsilon):
-            successes += 1
-            print("%d\tSession was successful. Requested %d samples." % (n_sessions, m))
-        else:
-            print("%d\tSession was unsuccessful. Requested %d samples." % (n_sessions, m))
-        print("Success rate: %.2f%%" % ((successes / n_sessions) * 100))
+    try:
+        while not converged:
+            seeds = [session_seed(seed, session) for session in range(n_sessions, n_sessions + round_size)]
+            arguments = (run_session, seeds, repeat(epsilon), repeat(delta), repeat(batch), repeat(patience))
+            results = map(*arguments) if pool is None else pool.map(*arguments, chunksize=SESSIONS_PER_WORKER)
 
+            for successful, m in results:
+                print("-" * 64)
+                last_success_rate = successes / n_sessions if n_sessions else 0
+                n_sessions += 1
+                successes += successful
+                print("%d\tSession was %s. Requested %d samples." % (
+                    n_sessions, "successful" if successful else "unsuccessful", m))
+                print("Success rate: %.2f%%" % ((successes / n_sessions) * 100))
 
+                if n_sessions >= MIN_N_SESSIONS and \
+                        abs((successes / n_sessions) - last_success_rate) < CONVERGENCE_THRESHOLD:
+                    converged = True
+                    break
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
 
-    s = (successes / n_sessions)
-    print("Converged to success rate: %.2f%%" % (s * 100))
-    if s >= 1.0 - delta:
-        print("Project was successful.")
-    else:
-        print("Project was not successful.")
+    report(successes / n_sessions, delta)
+    return successes / n_sessions
 
 
 if __name__ == "__main__":
-    run_project()
+    parser = ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes, 0 for all CPUs (default: 1, in this process)")
+    parser.add_argument("--batch", action="store_true",
+                        help="exchange whole training and test blocks with the oracle")
+    parser.add_argument("--patience", type=int, default=None,
+                        help="stop training after this many samples without a hypothesis change")
+    arguments = parser.parse_args()
+    run_project(arguments.workers or None, batch=arguments.batch, patience=arguments.patience)
@@ -0,0 +1,180 @@
+def bits(mask):
+    """ Yields indices of the set bits of an integer bitmask in ascending order. """
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+def subsumes(clause, other):
+    """ A clause subsumes another one iff its literals are a subset of the other's literals. """
+    return not (clause[0] & ~other[0] or clause[1] & ~other[1])
+
+
+def is_tautology(clause):
+    return bool(clause[0] & clause[1])
+
+
+class ClauseIndex:
+    """
+    Set of clauses given as (positive_mask, negative_mask) integer pairs,
+    indexed by the literals they contain.
+    """
+
+    def __init__(self, n_variables):
+        self.clauses = set()
+        self.positive = [set() for _ in range(n_variables)]
+        self.negative = [set() for _ in range(n_variables)]
+
+    def __contains__(self, clause):
+        return clause in self.clauses
+
+    def __iter__(self):
+        return iter(self.clauses)
+
+    def __len__(self):
+        return len(self.clauses)
+
+    def occurrences(self, clause):
+        """ For every literal of the clause, the set of indexed clauses containing that literal. """
+        positive_mask, negative_mask = clause
+        return [self.positive[i] for i in bits(positive_mask)] + [self.negative[i] for i in bits(negative_mask)]
+
+    def add(self, clause):
+        self.clauses.add(clause)
+        for occurrences in self.occurrences(clause):
+            occurrences.add(clause)
+
+    def remove(self, clause):
+        self.clauses.discard(clause)
+        for occurrences in self.occurrences(clause):
+            occurrences.discard(clause)
+
+    def partners(self, variable, positive):
+        """ Clauses that can be resolved on the variable with a clause containing it with the given sign. """
+        return self.negative[variable] if positive else self.positive[variable]
+
+    def subsumes(self, clause):
+        """ Returns True iff some indexed clause subsumes the given one. """
+        if clause in self.clauses:
+            return True
+        # a subsuming clause shares at least one literal with the subsumed one
+        return any(subsumes(other, clause)
+                   for occurrences in self.occurrences(clause)
+                   for other in occurrences)
+
+    def subsumed_by(self, clause):
+        """ Returns the indexed clauses subsumed by the given one. """
+        occurrences = sorted(self.occurrences(clause), key=len)
+        if not occurrences:
+            return set(self.clauses)
+        # a subsumed clause contains every literal of the subsuming one
+        return set(other for other in occurrences[0] if subsumes(clause, other))
+
+
+class ResolutionEngine:
+    """
+    Incremental resolution saturation over clauses given as (positive_mask, negative_mask) integer pairs.
+
+    The engine keeps a saturated set of clauses, reduced by subsumption. Adding a clause resolves only the new
+    clause and its descendants against that set, resolution partners are looked up by the complementary literal.
+    A set of clauses is unsatisfiable iff the empty clause is derived.
+    """
+
+    EMPTY_CLAUSE = (0, 0)
+
+    def __init__(self, n_variables):
+        self.n_variables = n_variables
+        self.index = ClauseIndex(n_variables)
+
+        # statistics for benchmarking
+        self.n_resolvents = 0
+        self.n_tautologies = 0
+        self.n_subsumed = 0
+
+    def statistics(self):
+        return {
+            "clauses": len(self.index),
+            "resolvents": self.n_resolvents,
+            "tautologies": self.n_tautologies,
+            "subsumed": self.n_subsumed,
+        }
+
+    def saturate(self, clause):
+        """
+        Saturates the engine's clauses extended by the given clause without modifying the engine.
+
+        :param clause: (positive_mask, negative_mask) of the clause.
+        :return: The new clauses of the saturated set or None if the empty clause has been derived.
+        :rtype: ClauseIndex
+        """
+        new = ClauseIndex(self.n_variables)
+        if clause == self.EMPTY_CLAUSE:
+            return None
+        if is_tautology(clause) or self.index.subsumes(clause):
+            return new
+
+        new.add(clause)
+        to_resolve = [clause]
+
+        while to_resolve:
+            clause = to_resolve.pop()
+            if clause not in new:
+                # removed by backward subsumption in the meantime
+                continue
+
+            positive_mask, negative_mask = clause
+            for positive, variables in ((True, positive_mask), (False, negative_mask)):
+                for variable in bits(variables):
+                    bit = ~(1 << variable)
+                    partners = list(self.index.partners(variable, positive)) + list(new.partners(variable, positive))
+
+                    for other in partners:
+                        resolvent = ((positive_mask | other[0]) & bit, (negative_mask | other[1]) & bit)
+                        self.n_resolvents += 1
+
+                        if resolvent == self.EMPTY_CLAUSE:
+                            return None
+                        if is_tautology(resolvent):
+                            self.n_tautologies += 1
+                            continue
+                        if self.index.subsumes(resolvent) or new.subsumes(resolvent):
+                            self.n_subsumed += 1
+                            continue
+
+                        for subsumed in new.subsumed_by(resolvent):
+                            new.remove(subsumed)
+                            self.n_subsumed += 1
+                        new.add(resolvent)
+                        to_resolve.append(resolvent)
+
+                    if clause not in new:
+                        break
+                if clause not in new:
+                    break
+
+        return new
+
+    def commit(self, new):
+        """ Merges clauses returned by saturate into the engine. """
+        for clause in new:
+            for subsumed in self.index.subsumed_by(clause):
+                self.index.remove(subsumed)
+                self.n_subsumed += 1
+            self.index.add(clause)
+
+    def is_consistent_with(self, clause):
+        return self.saturate(clause) is not None
+
+    def add(self, clause):
+        """
+        Adds the clause iff the clauses stay satisfiable.
+
+        :return: True iff the clause has been added.
+        :rtype: bool
+        """
+        new = self.saturate(clause)
+        if new is None:
+            return False
+        self.commit(new)
+        return True
@@ -0,0 +1,122 @@
+from resolution import bits, is_tautology
+
+
+class DPLLSolver:
+    """
+    DPLL satisfiability checker over clauses given as (positive_mask, negative_mask) integer pairs.
+
+    An assignment is a pair of bitmasks (true_mask, false_mask) of the variables set to True and False.
+    It has the same interface as resolution.ResolutionEngine, so both can be used as a consistency checker of CNF.
+    """
+
+    def __init__(self, n_variables):
+        self.n_variables = n_variables
+        self.clauses = []
+        # a model of all clauses added so far, new clauses it satisfies need no search
+        self.model = (0, 0)
+
+        # statistics for benchmarking
+        self.n_decisions = 0
+        self.n_propagations = 0
+        self.n_conflicts = 0
+
+    def statistics(self):
+        return {
+            "clauses": len(self.clauses),
+            "decisions": self.n_decisions,
+            "propagations": self.n_propagations,
+            "conflicts": self.n_conflicts,
+        }
+
+    def propagate(self, clauses, true_mask, false_mask):
+        """
+        Simplifies the clauses by the assignment and applies unit propagation until a fixpoint.
+
+        :return: The remaining clauses restricted to unassigned literals and the extended assignment,
+                 or None on conflict.
+        """
+        while True:
+            remaining = []
+            units_true = units_false = 0
+
+            for positive_mask, negative_mask in clauses:
+                if positive_mask & true_mask or negative_mask & false_mask or positive_mask & negative_mask:
+                    # satisfied or a tautology
+                    continue
+                positive_mask &= ~false_mask
+                negative_mask &= ~true_mask
+                literals = positive_mask | negative_mask
+                if not literals:
+                    self.n_conflicts += 1
+                    return None
+                if not literals & (literals - 1):
+                    units_true |= positive_mask
+                    units_false |= negative_mask
+                remaining.append((positive_mask, negative_mask))
+
+            if units_true & units_false:
+                self.n_conflicts += 1
+                return None
+            if not units_true | units_false:
+                return remaining, true_mask, false_mask
+
+            self.n_propagations += bin(units_true | units_false).count("1")
+            clauses = remaining
+            true_mask |= units_true
+            false_mask |= units_false
+
+    def solve(self, clauses, true_mask=0, false_mask=0):
+        """
+        :return: A (partial) model (true_mask, false_mask) of the clauses or None if they are unsatisfiable.
+        """
+        propagated = self.propagate(clauses, true_mask, false_mask)
+        if propagated is None:
+            return None
+        clauses, true_mask, false_mask = propagated
+        if not clauses:
+            return true_mask, false_mask
+
+        # branch on a literal of the shortest clause
+        positive_mask, negative_mask = min(clauses, key=lambda c: bin(c[0] | c[1]).count("1"))
+        variable = next(bits(positive_mask | negative_mask))
+        bit = 1 << variable
+        first_true = bool(positive_mask & bit)
+
+        self.n_decisions += 1
+        for value in (first_true, not first_true):
+            if value:
+                model = self.solve(clauses, true_mask | bit, false_mask)
+            else:
+                model = self.solve(clauses, true_mask, false_mask | bit)
+            if model is not None:
+                return model
+        return None
+
+    @staticmethod
+    def satisfies(model, clause):
+        true_mask, false_mask = model
+        return bool(clause[0] & true_mask or clause[1] & false_mask)
+
+    def check(self, clause):
+        if is_tautology(clause) or self.satisfies(self.model, clause):
+            return self.model
+        return self.solve(self.clauses + [clause])
+
+    def is_consistent_with(self, clause):
+        return self.check(clause) is not None
+
+    def add(self, clause):
+        """
+        Adds the clause iff the clauses stay satisfiable.
+
+        :return: True iff the clause has been added.
+        :rtype: bool
+        """
+        model = self.check(clause)
+        if model is None:
+            return False
+        if not is_tautology(clause):
+            # tautologies constrain nothing, they are accepted but not kept
+            self.model = model
+            self.clauses.append(clause)
+        return True
@@ -1,10 +1,18 @@
 import numpy as np
-import operator
+import weakref
+
+import bitmask
 
 class AssociativeBinaryBooleanOperation:
-    """ Common functionality for conjunctions and disjunctions. """
-    def __init__(self, positive_literals, negative_literals):
-        """ Initialize from arrays of literals.
+    """
+    Common functionality for conjunctions and disjunctions.
+
+    Instances are interned and immutable: they are identified by their key (n_variables, positive_mask, negative_mask)
+    where the masks are full-width integer bitmasks of the literals, constructing a formula with an existing key
+    returns the existing instance and attributes cannot be reassigned.
+    """
+    def __new__(cls, positive_literals, negative_literals):
+        """ Returns the interned formula with the given arrays of literals.
 
         :param positive_literals: Indicator vector od positive literals.
         :type negative_literals: Iterable[bool]
@@ -15,10 +23,67 @@ class AssociativeBinaryBooleanOperation:
         if len(positive_literals) != len(negative_literals):
             raise ValueError("positive_literals and negative_literals vectors must have the same length!")
 
-        self.positive_literals = positive_literals
-        self.negative_literals = negative_literals
-        self.n_variables = len(positive_literals)
-        self.labels = ["var"+str(i) for i in range(self.n_variables)]
+        positive_literals = np.array(positive_literals, dtype=bool)
+        negative_literals = np.array(negative_literals, dtype=bool)
+        key = (len(positive_literals), bitmask.to_int(positive_literals), bitmask.to_int(negative_literals))
+        formula = cls._interned.get(key)
+        if formula is None:
+            formula = cls._create(key, positive_literals, negative_literals)
+        return formula
+
+    @classmethod
+    def _create(cls, key, positive_literals, negative_literals):
+        formula = super().__new__(cls)
+        positive_literals.setflags(write=False)
+        negative_literals.setflags(write=False)
+        n_variables, positive_mask, negative_mask = key
+        attributes = {
+            "positive_literals": positive_literals,
+            "negative_literals": negative_literals,
+            "n_variables": n_variables,
+            "labels": tuple("var" + str(i) for i in range(n_variables)),
+            "positive_mask": positive_mask,
+            "negative_mask": negative_mask,
+            "key": key,
+        }
+        for name, value in attributes.items():
+            object.__setattr__(formula, name, value)
+        cls._interned[key] = formula
+        return formula
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._interned = weakref.WeakValueDictionary()
+
+    @classmethod
+    def from_masks(cls, n_variables, positive_mask, negative_mask):
+        """
+        Returns the interned formula with the given integer literal bitmasks.
+        The literal arrays are only built when the formula is not interned yet.
+
+        :param n_variables: Number of propositional variables
+        :type n_variables: int
+        :param positive_mask: Bit i is set iff the formula contains the literal var_i.
+        :type positive_mask: int
+        :param negative_mask: Bit i is set iff the formula contains the literal ~var_i.
+        :type negative_mask: int
+        """
+        key = (n_variables, positive_mask, negative_mask)
+        formula = cls._interned.get(key)
+        if formula is None:
+            formula = cls._create(key,
+                                  bitmask.from_int(positive_mask, n_variables),
+                                  bitmask.from_int(negative_mask, n_variables))
+        return formula
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s is immutable" % self.__class__.__name__)
+
+    def __delattr__(self, name):
+        raise AttributeError("%s is immutable" % self.__class__.__name__)
+
+    def __reduce__(self):
+        return self.__class__.from_masks, self.key
    
     @classmethod
     def random(cls, n_variables, q = None, s = None):
@@ -98,19 +163,17 @@ class AssociativeBinaryBooleanOperation:
                 if literal)
 
     def __eq__(self, other):
-        return type(self) is type(other) and \
-                np.all(self.positive_literals == other.positive_literals) and \
-                np.all(self.negative_literals == other.negative_literals)
+        return self is other or (type(self) is type(other) and self.key == other.key)
 
     def __hash__(self):
-        return int(np.packbits((self.positive_literals, self.negative_literals))[0])
+        return hash(self.key)
 
 class Disjunction(AssociativeBinaryBooleanOperation):
     fold = staticmethod(np.any)
     operator_str = " | "
 
     def is_satisfiable(self):
-        return np.any((self.positive_literals, self.negative_literals))
+        return bool(self.positive_mask | self.negative_mask)
 
     def is_tautology(self):
-        return any(map(operator.and_, self.positive_literals, self.negative_literals))
+        return bool(self.positive_mask & self.negative_mask)
@@ -2,6 +2,10 @@ from logic import *
 from typing import List, Set
 from pandas import DataFrame
 from tools import toBytes, fromBytes
+from subsumption import thetaSubsumes, SubsumptionCache
+
+# answers repeated questions of subsume with the Python engine
+subsumptionCache = SubsumptionCache()
 
 StringTransfer = autoclass('ida.courses.ilp.StringTransfer')
 
@@ -94,14 +98,29 @@ def clauseToStr(clause: Clause) -> str:
     return fromBytes(JSMU.str(clause.claus))
 
 
-def subsume(alpha: Clause, beta: Clause) -> bool:
+def subsume(alpha: Clause, beta: Clause, engine: str = "python", cache: bool = True) -> bool:
     '''
     Returns true iff alpha theta-subsumes beta.
+
+    By default the question is decided in-process by the engine in subsumption.py. Set engine to 'java' to ask the
+    Java subsumption engine instead, or to 'check' to run both and raise an error if they disagree. Results of the
+    Python engine go through subsumptionCache unless cache is False; see subsumptionCache.info() for its counters.
     
     :param alpha: Clause 
     :param beta: Clause
+    :param engine: str, one of 'python', 'java' and 'check'
+    :param cache: bool
     :return: bool 
     '''
     if not isinstance(alpha, Clause) or not isinstance(beta, Clause):
         raise ValueError('The both given clauses must be of a type Clause!')
-    return JSMU.subsumes(alpha.claus, beta.claus)
+    if engine == "python":
+        return subsumptionCache.subsume(alpha, beta) if cache else thetaSubsumes(alpha, beta)
+    if engine == "java":
+        return JSMU.subsumes(alpha.claus, beta.claus)
+    if engine == "check":
+        result = thetaSubsumes(alpha, beta)
+        if result != JSMU.subsumes(alpha.claus, beta.claus):
+            raise AssertionError('subsumption engines disagree on {} subsuming {}'.format(alpha, beta))
+        return result
+    raise ValueError('unknown subsumption engine:\t{}'.format(engine))
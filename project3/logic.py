@@ -2,8 +2,8 @@ import os
 
 os.environ['CLASSPATH'] = os.sep.join([".", "smu.jar"])
 
-import itertools
-from typing import Set, Iterable, List, Tuple, Dict, Iterator
+import weakref
+from typing import Set, FrozenSet, Iterable, List, Tuple, Dict, Iterator
 from jnius import autoclass
 import types
 from tools import toBytes, fromBytes, unionSets
@@ -13,6 +13,10 @@ This file contains various support for first order predicate (FOL) logic.
 
 Note that all of the symbols, except of variable, should start with a lower-case letter. Only variable can start with upper-case letter.
 Also note that symbols (names of variables, constants, functors, compound terms, predicates) should not contain bracket.
+
+Terms, functors, predicates, atoms and literals are immutable and hash-consed: constructing one with the same content
+as an existing instance returns that instance, so equality is identity and hashes are computed only once. Instances
+are kept in weak tables, so the unused ones are freed.
 '''
 
 JTerm = autoclass('ida.ilp.logic.Term')
@@ -33,6 +37,7 @@ class Term:
     '''
     An interface for FOL term.
     '''
+    __slots__ = ()
 
     def getVariables(self) -> Set['Variable']:
         '''
@@ -77,17 +82,42 @@ class Variable(Term):
     Represents FOL variable.
     '''
 
-    def __init__(self, name: str):
-        self.var: JVariable = name if isinstance(name, JVariable) else JVariable.construct(toBytes(str(name)))
+    __slots__ = ('name', '_var', '_hash', '__weakref__')
+    _instances = weakref.WeakValueDictionary()
+
+    def __new__(cls, name: str):
+        java = name if isinstance(name, JVariable) else None
+        name = toStr(name) if java is not None else str(name)
+        variable = cls._instances.get(name)
+        if variable is None:
+            variable = super().__new__(cls)
+            variable.name = name
+            variable._var = java
+            variable._hash = hash(name)
+            cls._instances[name] = variable
+        elif variable._var is None:
+            variable._var = java
+        return variable
+
+    @property
+    def var(self) -> JVariable:
+        '''
+        The Java peer of the variable, created on first use.
+
+        :rtype: JVariable
+        '''
+        if self._var is None:
+            self._var = JVariable.construct(toBytes(self.name))
+        return self._var
 
     def __hash__(self):
-        return hash(str(self))
+        return self._hash
 
     def __str__(self):
-        return toStr(self.var)
+        return self.name
 
     def __eq__(self, o: object) -> bool:
-        return isinstance(o, self.__class__) and str(self) == str(o)
+        return self is o
 
     def __ne__(self, o: object) -> bool:
         return not self.__eq__(o)
@@ -135,20 +165,45 @@ class Constant(Term):
     Represents FOL constant.
     '''
 
-    def __init__(self, name: str):
-        self.const: JConstant = name if isinstance(name, JConstant) else JConstant.construct(toBytes(str(name)))
+    __slots__ = ('name', '_const', '_hash', '__weakref__')
+    _instances = weakref.WeakValueDictionary()
+
+    def __new__(cls, name: str):
+        java = name if isinstance(name, JConstant) else None
+        name = toStr(name) if java is not None else str(name)
+        constant = cls._instances.get(name)
+        if constant is None:
+            constant = super().__new__(cls)
+            constant.name = name
+            constant._const = java
+            constant._hash = hash(name)
+            cls._instances[name] = constant
+        elif constant._const is None:
+            constant._const = java
+        return constant
+
+    @property
+    def const(self) -> JConstant:
+        '''
+        The Java peer of the constant, created on first use.
+
+        :rtype: JConstant
+        '''
+        if self._const is None:
+            self._const = JConstant.construct(toBytes(self.name))
+        return self._const
 
     def __str__(self):
-        return toStr(self.const)
+        return self.name
 
     def __eq__(self, other):
-        return isinstance(other, self.__class__) and str(self) == str(other)
+        return self is other
 
     def __ne__(self, other):
         return not self == other
 
     def __hash__(self):
-        return hash(str(self))
+        return self._hash
 
     def getVariables(self) -> Set[Variable]:
         '''
@@ -190,19 +245,28 @@ class Functor:
     '''
     Represents FOL functor.
     '''
-
-    def __init__(self, name: str, arity: int):
-        self.name: str = name
-        self.arity: int = arity
+    __slots__ = ('name', 'arity', '_hash', '__weakref__')
+    _instances = weakref.WeakValueDictionary()
+
+    def __new__(cls, name: str, arity: int):
+        key = (name, arity)
+        functor = cls._instances.get(key)
+        if functor is None:
+            functor = super().__new__(cls)
+            functor.name = name
+            functor.arity = arity
+            functor._hash = hash(key)
+            cls._instances[key] = functor
+        return functor
 
     def __eq__(self, other):
-        return isinstance(other, self.__class__) and self.name == other.name and self.arity == other.arity
+        return self is other
 
     def __ne__(self, other):
         return not self == other
 
     def __hash__(self):
-        return (self.name, self.arity).__hash__()
+        return self._hash
 
     def __str__(self):
         return "{}/{}".format(self.name, self.arity)
@@ -213,8 +277,10 @@ class CompoundTerm(Term):
     Use .functor to get Functor of this composed term.
     Use .terms to get tuple of terms.
     '''
+    __slots__ = ('functor', 'terms', '_str', '_func', '_hash', '__weakref__')
+    _instances = weakref.WeakValueDictionary()
 
-    def __init__(self, functor: Functor, terms: Iterable[Term]):
+    def __new__(cls, functor: Functor, terms: Iterable[Term]):
         '''
         Creates and returns a new compound term which is constructed by a functor applied to list of arguments.
 
@@ -227,22 +293,40 @@ class CompoundTerm(Term):
             raise ValueError(
                 "functor's arity '{}' is different than arguments given '{}'".format(functor,
                                                                                      ', '.join(map(str, terms))))
-        self.func: JFunction = JFunction.parseFunction(
-            toBytes("{}({})".format(functor.name, ', '.join(map(str, terms)))))
-        self.functor: Functor = functor
-        self.terms: Tuple[Term] = terms
+        key = (functor, terms)
+        term = cls._instances.get(key)
+        if term is None:
+            term = super().__new__(cls)
+            term.functor = functor
+            term.terms = terms
+            term._str = "{}({})".format(functor.name, ', '.join(map(str, terms)))
+            term._func = None
+            term._hash = hash(term._str)
+            cls._instances[key] = term
+        return term
+
+    @property
+    def func(self) -> JFunction:
+        '''
+        The Java peer of the term, created on first use.
+
+        :rtype: JFunction
+        '''
+        if self._func is None:
+            self._func = JFunction.parseFunction(toBytes(str(self)))
+        return self._func
 
     def __eq__(self, other):
-        return isinstance(other, self.__class__) and self.func.equals(other)
+        return self is other
 
     def __ne__(self, other):
         return not self == other
 
     def __hash__(self):
-        return self.func.hashCode()
+        return self._hash
 
     def __str__(self):
-        return self.func.toString()
+        return self._str
 
     def __iter__(self) -> Iterator[Term]:
         return iter(self.terms)
@@ -288,7 +372,10 @@ class CompoundTerm(Term):
 
 
 class Predicate:
-    def __init__(self, name: str, arity: int):
+    __slots__ = ('name', 'arity', '_hash', '__weakref__')
+    _instances = weakref.WeakValueDictionary()
+
+    def __new__(cls, name: str, arity: int):
         '''
         Creates and returns a new predicate by given name and arity. Length of the name should be longer than zero.
 
@@ -296,17 +383,24 @@ class Predicate:
         :param arity: int,>=0
         :rtype: Predicate
         '''
-        self.name: str = name
-        self.arity: int = arity
+        key = (name, arity)
+        predicate = cls._instances.get(key)
+        if predicate is None:
+            predicate = super().__new__(cls)
+            predicate.name = name
+            predicate.arity = arity
+            predicate._hash = hash(key)
+            cls._instances[key] = predicate
+        return predicate
 
     def __eq__(self, other):
-        return isinstance(other, self.__class__) and self.name == other.name and self.arity == other.arity
+        return self is other
 
     def __ne__(self, other):
         return not self == other
 
     def __hash__(self):
-        return (self.name, self.arity).__hash__()
+        return self._hash
 
     def __str__(self):
         '''
@@ -318,7 +412,10 @@ class Predicate:
 
 
 class Atom:
-    def __init__(self, predicate: Predicate, terms: Iterable[Term]):
+    __slots__ = ('predicate', 'terms', 'arity', '_str', '_hash', '__weakref__')
+    _instances = weakref.WeakValueDictionary()
+
+    def __new__(cls, predicate: Predicate, terms: Iterable[Term]):
         '''
         Creates new atom given predicate and list of terms.
 
@@ -331,24 +428,33 @@ class Atom:
             raise ValueError(
                 "predicate's '{}' arity differs from the arguments given '{}'".format(predicate,
                                                                                       ', '.join(map(str, terms))))
-        self.predicate: Predicate = predicate if isinstance(predicate, Predicate) else Predicate(predicate, len(terms))
-        self.terms: Tuple[Term] = terms
-        self.arity: int = predicate.arity
+        predicate = predicate if isinstance(predicate, Predicate) else Predicate(predicate, len(terms))
+        key = (predicate, terms)
+        atom = cls._instances.get(key)
+        if atom is None:
+            atom = super().__new__(cls)
+            atom.predicate = predicate
+            atom.terms = terms
+            atom.arity = predicate.arity
+            if 1 > atom.arity:
+                atom._str = predicate.name
+            else:
+                atom._str = "{}({})".format(predicate.name, ", ".join(map(str, terms)))
+            atom._hash = hash(atom._str)
+            cls._instances[key] = atom
+        return atom
 
     def __str__(self):
-        if 1 > self.arity:
-            return self.predicate.name
-        return "{}({})".format(self.predicate.name, ", ".join(map(str, self.terms)))
+        return self._str
 
-    # just lexical comparison
     def __eq__(self, other):
-        return isinstance(other, Atom) and str(self) == str(other)
+        return self is other
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
     def __hash__(self):
-        return hash(str(self))
+        return self._hash
 
     def __iter__(self) -> Iterator[Term]:
         return iter(self.terms)
@@ -399,7 +505,10 @@ class Atom:
 
 
 class Literal:
-    def __init__(self, atom: Atom, positive: bool = True):
+    __slots__ = ('atom', 'positive', '_str', '_lit', '_hash', '__weakref__')
+    _instances = weakref.WeakValueDictionary()
+
+    def __new__(cls, atom: Atom, positive: bool = True):
         '''
         Creates and returns a new literal from the atom. The literal is negation of the atom if positive is set to False.
 
@@ -407,22 +516,41 @@ class Literal:
         :type positive: bool
         :rtype: Literal
         '''
-        self.lit: JLiteral = JLiteral(toBytes(atom.predicate.name), not positive, toJava(atom.terms))
-        self.atom: Atom = atom
-        self.positive: bool = positive
+        positive = bool(positive)
+        key = (atom, positive)
+        literal = cls._instances.get(key)
+        if literal is None:
+            literal = super().__new__(cls)
+            literal.atom = atom
+            literal.positive = positive
+            literal._str = "{}{}".format("" if positive else "!", str(atom))
+            literal._lit = None
+            literal._hash = hash(literal._str)
+            cls._instances[key] = literal
+        return literal
+
+    @property
+    def lit(self) -> JLiteral:
+        '''
+        The Java peer of the literal, created on first use.
+
+        :rtype: JLiteral
+        '''
+        if self._lit is None:
+            self._lit = JLiteral(toBytes(self.atom.predicate.name), not self.positive, toJava(self.atom.terms))
+        return self._lit
 
     def __str__(self):
-        return "{}{}".format("" if self.positive else "!", str(self.atom))
+        return self._str
 
-    # just lexical comparison
     def __eq__(self, other):
-        return isinstance(other, self.__class__) and str(self) == str(other)
+        return self is other
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
     def __hash__(self):
-        return hash(str(self))
+        return self._hash
 
     def __iter__(self) -> Iterator[Atom]:
         return iter(self.atom)
@@ -488,9 +616,23 @@ class Clause(Iterable[Literal]):
         :type literals: iterable of Literal
         :rtype: Clause
         '''
-        tup = tuple(literals)
-        self.claus: JClause = JClause(toJava(tup))
-        self.literals: Tuple[Term] = tup
+        self._claus: JClause = None
+        self._str: str = None
+        self._hash: int = None
+        self._literalSet: FrozenSet[Literal] = None
+        self.literals: Tuple[Literal] = tuple(literals)
+
+    @property
+    def claus(self) -> JClause:
+        '''
+        The Java peer of the clause, created on first use, e.g. by bridge.subsume with the Java engine or by
+        bridge.clauseToStr. Purely Python manipulation of clauses does not touch the JVM.
+
+        :rtype: JClause
+        '''
+        if self._claus is None:
+            self._claus = JClause(toJava(self.literals))
+        return self._claus
 
     def __str__(self, endingDot=True):
         '''
@@ -499,21 +641,22 @@ class Clause(Iterable[Literal]):
         :type endingDot: bool
         :rtype: str
         '''
-        if not self.literals:
-            return "{{}}{}".format("." if endingDot else "")
-        return '{}{}'.format(
-            ' | '.join(sorted(map(str, self.literals))),
-            "." if endingDot else "")
+        if self._str is None:
+            self._str = ' | '.join(sorted(map(str, self.literals))) if self.literals else "{}"
+        return self._str + "." if endingDot else self._str
 
-    # just lexical comparison
+    # just lexical comparison, the string and the hash are computed once
     def __eq__(self, other):
-        return isinstance(other, self.__class__) and str(self) == str(other)
+        return self is other or isinstance(other, self.__class__) and hash(self) == hash(other) \
+               and self.__str__(endingDot=False) == other.__str__(endingDot=False)
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
     def __hash__(self):
-        return hash(str(self))
+        if self._hash is None:
+            self._hash = hash(self.__str__(endingDot=False))
+        return self._hash
 
     def __iter__(self) -> Iterator[Literal]:
         return iter(self.literals)
@@ -521,6 +664,17 @@ class Clause(Iterable[Literal]):
     def __len__(self):
         return len(self.literals)
 
+    def getLiteralSet(self) -> FrozenSet[Literal]:
+        '''
+        Returns the literals of the clause as a frozen set. Literals are hash-consed, so the set identifies the clause
+        up to the order and repetition of its literals; it is computed once.
+
+        :rtype: frozenset of Literal
+        '''
+        if self._literalSet is None:
+            self._literalSet = frozenset(self.literals)
+        return self._literalSet
+
     def getPredicates(self) -> Set[Predicate]:
         '''
         Returns set of predicates in the clause.
@@ -552,23 +706,138 @@ class Clause(Iterable[Literal]):
 
     def getCanonicString(self) -> str:
         '''
-        Returns canonical string for the clause.
+        Returns canonical string for the clause, i.e. the string of the clause with its variables renamed to constants
+        x0, x1, ... in a canonical order, so that two clauses get the same string iff they are equal up to renaming
+        of variables.
+
+        The order comes from colour refinement: every variable starts with the same colour, which is then repeatedly
+        replaced by its colour together with the literals it occurs in, its positions in them and the colours of
+        the other variables there, until no colour class splits any more. If some class still holds several
+        variables, each variable of the first such class is tried as the first of the class and refined again; the
+        smallest of the resulting strings is returned. Branches mapped onto each other by an automorphism found on the way, i.e. two branches
+        rendering the same clause, are tried only once.
 
         :rtype: str
         '''
         variables = list(self.getVariables())
-        count = len(variables)
-        if count < 1:
+        if not variables:
             return str(self)
-        minimal = None
 
-        for permutation in itertools.permutations(list(map(lambda x: Constant("x" + str(x)), range(count))), count):
-            substitution = {variables[idx]: permutation[idx] for idx in range(count)}
-            substituted = str(self.substitute(substitution))
-            if minimal is None or substituted < minimal:
-                minimal = substituted
-
-        return minimal
+        # variables are numbered, templates hold their numbers between the string pieces
+        numbers = {variable: idx for idx, variable in enumerate(variables)}
+        templates = [[piece if isinstance(piece, str) else numbers[piece] for piece in _canonicTemplate(literal)]
+                     for literal in self.literals]
+        # per literal the skeleton rank (the string pieces with the variables left out) and its variables in order
+        skeletons = [tuple((0, piece) if isinstance(piece, str) else (1, "") for piece in template)
+                     for template in templates]
+        skeletonRanks = {skeleton: rank for rank, skeleton in enumerate(sorted(set(skeletons)))}
+        occurrences = [[] for _ in variables]
+        for skeleton, template in zip(skeletons, templates):
+            slots = tuple(piece for piece in template if not isinstance(piece, str))
+            for variable in set(slots):
+                positions = tuple(position for position, slot in enumerate(slots) if slot == variable)
+                occurrences[variable].append((skeletonRanks[skeleton], positions, slots))
+
+        def refine(colours):
+            classes = len(set(colours))
+            while True:
+                signatures = [(colours[variable], tuple(sorted(
+                    (skeleton, positions, tuple(colours[slot] for slot in slots))
+                    for skeleton, positions, slots in occurrences[variable])))
+                    for variable in range(len(variables))]
+                ranks = {signature: rank for rank, signature in enumerate(sorted(set(signatures)))}
+                colours = [ranks[signature] for signature in signatures]
+                if len(ranks) == classes:
+                    return colours
+                classes = len(ranks)
+
+        def individualize(colours, variable):
+            colours = [2 * colour for colour in colours]
+            colours[variable] -= 1
+            return refine(colours)
+
+        best = None
+        # structure of every rendered clause -> order of the variables and individualized variables of its first leaf
+        leaves = {}
+        automorphisms = []
+
+        def leaf(colours, fixed):
+            '''
+            Renders the leaf and returns the depth of the branch to give up, if the leaf renders the same clause as an
+            earlier one.
+            '''
+            nonlocal best
+            order = sorted(range(len(variables)), key=colours.__getitem__)
+            names = [None] * len(variables)
+            for idx, variable in enumerate(order):
+                names[variable] = "x" + str(idx)
+            string = ' | '.join(sorted(''.join(piece if isinstance(piece, str) else names[piece] for piece in template)
+                                       for template in templates))
+            if best is None or string < best:
+                best = string
+            # compared on the structure, as constants may be named like the renamed variables
+            key = tuple(sorted(tuple((0, piece) if isinstance(piece, str) else (1, colours[piece]) for piece in template)
+                               for template in templates))
+            if key not in leaves:
+                leaves[key] = (order, fixed)
+                return None
+            # the automorphism maps the path of the earlier leaf onto this one, so the subtree below their common
+            # ancestor is an image of an explored one
+            previousOrder, previousFixed = leaves[key]
+            automorphism = [0] * len(variables)
+            for previous, variable in zip(previousOrder, order):
+                automorphism[previous] = variable
+            support = frozenset(variable for variable, image in enumerate(automorphism) if image != variable)
+            automorphisms.append((support, automorphism))
+            common = 0
+            while previousFixed[common] == fixed[common]:
+                common += 1
+            return common
+
+        def find(parent, variable):
+            while parent[variable] != variable:
+                parent[variable] = parent[parent[variable]]
+                variable = parent[variable]
+            return variable
+
+        def candidate(frame):
+            # orbits of the found automorphisms fixing the individualized variables, they map the cell onto itself
+            colours, fixed, cell, tried, parent, merged = frame
+            for support, automorphism in automorphisms[merged:]:
+                if support.isdisjoint(fixed):
+                    for variable in support:
+                        if variable in parent:
+                            parent[find(parent, variable)] = find(parent, automorphism[variable])
+            frame[5] = len(automorphisms)
+            explored = set(find(parent, variable) for variable in tried)
+            return next((variable for variable in cell if find(parent, variable) not in explored), None)
+
+        # frames [colours, individualized variables, cell to branch over, variables of the cell tried so far,
+        # union-find parents of the orbits in the cell, number of automorphisms merged into them], the frame at depth
+        # d has d individualized variables
+        stack = [[refine([0] * len(variables)), (), None, [], None, 0]]
+        while stack:
+            frame = stack[-1]
+            colours, fixed, cell = frame[:3]
+            if cell is None:
+                classes = {}
+                for variable, colour in enumerate(colours):
+                    classes.setdefault(colour, []).append(variable)
+                if len(classes) == len(variables):
+                    depth = leaf(colours, fixed)
+                    del stack[len(stack) - 1 if depth is None else depth + 1:]
+                    continue
+                frame[2] = cell = classes[min(colour for colour, members in classes.items() if len(members) > 1)]
+                frame[4] = {variable: variable for variable in cell}
+
+            variable = candidate(frame)
+            if variable is None:
+                stack.pop()
+                continue
+            frame[3].append(variable)
+            stack.append([individualize(colours, variable), fixed + (variable,), None, [], None, 0])
+
+        return "{}.".format(best)
 
     def substitute(self, substitution: Dict[Variable, Term]) -> Term:
         '''
@@ -844,6 +1113,28 @@ class Interpretation:
         return unionSets(map(lambda atom: atom.getFunctors(), self.atoms))
 
 
+def _canonicTemplate(term) -> List:
+    '''
+    Returns the string of a literal, atom or term split into pieces: strings and the variables in between.
+    '''
+    if isinstance(term, Variable):
+        return [term]
+    if isinstance(term, Literal):
+        return ([] if term.positive else ["!"]) + _canonicTemplate(term.atom)
+    if isinstance(term, Atom) and 1 > term.arity:
+        return [term.predicate.name]
+    if isinstance(term, (Atom, CompoundTerm)):
+        name = term.predicate.name if isinstance(term, Atom) else term.functor.name
+        pieces = [name + "("]
+        for idx, argument in enumerate(term.terms):
+            if idx > 0:
+                pieces.append(", ")
+            pieces.extend(_canonicTemplate(argument))
+        pieces.append(")")
+        return pieces
+    return [str(term)]
+
+
 def toJava(term: 'PythonLogic') -> 'JavaLogic':
     if isinstance(term, JLiteral) or isinstance(term, JConstant) or isinstance(term, JVariable) or isinstance(term,
                                                                                                               JClause):
@@ -876,7 +1167,9 @@ def toPython(java: 'JavaLogic') -> 'PythonLogic':
         return list(toPython(java.get(idx)) for idx in range(0, java.size()))
     if isinstance(java, JClause):
         literals = java.literals().toArray()
-        return Clause(toPython(literals[idx]) for idx in range(0, java.literals().size()))
+        clause = Clause(toPython(literals[idx]) for idx in range(0, java.literals().size()))
+        clause._claus = java
+        return clause
     if isinstance(java, JVariable):
         return Variable(java)
     if isinstance(java, JConstant):
@@ -884,7 +1177,9 @@ def toPython(java: 'JavaLogic') -> 'PythonLogic':
     if isinstance(java, JLiteral):
         arguments = list(toPython(java.get(idx)) for idx in range(0, java.arity()))
         atom = Atom(Predicate(toStr(java), java.arity()), arguments)
-        return Literal(atom, positive=not java.isNegated())
+        literal = Literal(atom, positive=not java.isNegated())
+        literal._lit = java
+        return literal
     if isinstance(java, JFunction):
         jterms = [toPython(java.get(idx)) for idx in range(0, java.arity())]
         return CompoundTerm(Functor(toStr(java), java.arity()), jterms)
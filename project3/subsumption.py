@@ -0,0 +1,351 @@
+from collections import OrderedDict, deque, namedtuple
+from heapq import heapify, heappop, heappush
+from typing import Callable, Dict, FrozenSet, List, Tuple
+
+from logic import Clause, Literal, Term, Variable, Constant, CompoundTerm
+
+'''
+In-process theta-subsumption engine, so that subsumption checks need not cross the JVM boundary.
+
+Clauses are first translated into plain tuples: a term becomes (VARIABLE, name), (CONSTANT, name) or
+(COMPOUND, functor name, tuple of terms), a literal becomes its signature (sign, predicate name, arity) and the tuple
+of its arguments. Deciding whether alpha subsumes beta is then a constraint satisfaction problem. Each literal of
+alpha has to be mapped onto a literal of beta with the same signature (candidates are looked up in an index by
+signature), and variables of alpha are bound consistently. Variables of beta behave as constants.
+'''
+
+VARIABLE, CONSTANT, COMPOUND = 0, 1, 2
+
+
+def termKey(term: Term) -> tuple:
+    '''
+    Returns a hashable tuple describing the term.
+
+    :type term: Term
+    :rtype: tuple
+    '''
+    if isinstance(term, Variable):
+        return VARIABLE, str(term)
+    if isinstance(term, CompoundTerm):
+        return COMPOUND, term.functor.name, tuple(termKey(t) for t in term.terms)
+    if isinstance(term, Constant):
+        return CONSTANT, str(term)
+    raise ValueError("not implemented for '{}' of type '{}'".format(str(term), str(type(term))))
+
+
+def literalKey(literal: Literal) -> Tuple[tuple, tuple]:
+    '''
+    Returns the signature and the arguments of the literal as hashable tuples.
+
+    :type literal: Literal
+    :rtype: (tuple, tuple)
+    '''
+    predicate = literal.getPredicate()
+    return (literal.positive, predicate.name, predicate.arity), tuple(termKey(term) for term in literal.atom.terms)
+
+
+def match(pattern: tuple, target: tuple, binding: Dict[tuple, tuple], trail: List[tuple]) -> bool:
+    '''
+    Extends the binding of pattern variables so that the pattern term becomes the target term. Newly bound
+    variables are appended to the trail; on failure the caller is responsible for undoing them.
+    '''
+    kind = pattern[0]
+    if kind == VARIABLE:
+        bound = binding.get(pattern)
+        if bound is None:
+            binding[pattern] = target
+            trail.append(pattern)
+            return True
+        return bound == target
+    if kind == CONSTANT:
+        return pattern == target
+    if target[0] != COMPOUND or target[1] != pattern[1] or len(target[2]) != len(pattern[2]):
+        return False
+    return all(match(p, t, binding, trail) for p, t in zip(pattern[2], target[2]))
+
+
+def termVariables(term: tuple, variables: set) -> set:
+    '''
+    Adds the variables occurring in the term to the set and returns it.
+    '''
+    if term[0] == VARIABLE:
+        variables.add(term)
+    elif term[0] == COMPOUND:
+        for t in term[2]:
+            termVariables(t, variables)
+    return variables
+
+
+def matchArguments(pattern: tuple, target: tuple, binding: Dict[tuple, tuple], trail: List[tuple]) -> bool:
+    mark = len(trail)
+    if all(match(p, t, binding, trail) for p, t in zip(pattern, target)):
+        return True
+    undo(binding, trail, mark)
+    return False
+
+
+def undo(binding: Dict[tuple, tuple], trail: List[tuple], mark: int):
+    while len(trail) > mark:
+        del binding[trail.pop()]
+
+
+class SubsumptionProblem:
+    '''
+    Theta-subsumption of a target clause by a pattern clause as a constraint satisfaction problem.
+
+    Use .solve() to find out whether the pattern subsumes the target, .substitution holds the binding found.
+    '''
+
+    def __init__(self, pattern: Clause, target: Clause):
+        self.pattern: List[Tuple[tuple, tuple]] = list(set(literalKey(literal) for literal in pattern))
+        self.target = set(literalKey(literal) for literal in target)
+        self.index: Dict[tuple, List[tuple]] = {}
+        for signature, arguments in self.target:
+            self.index.setdefault(signature, []).append(arguments)
+        self.substitution: Dict[tuple, tuple] = {}
+
+    def solve(self) -> bool:
+        candidates = self.initialCandidates()
+        if candidates is None or not self.arcConsistency(candidates):
+            return False
+        return self.search(candidates)
+
+    def initialCandidates(self) -> List[List[tuple]]:
+        '''
+        For every pattern literal, the target literals it can be matched to on its own. Returns None if some
+        pattern literal has no candidate.
+        '''
+        candidates = []
+        for signature, arguments in self.pattern:
+            binding, trail = {}, []
+            own = []
+            for target in self.index.get(signature, ()):
+                if matchArguments(arguments, target, binding, trail):
+                    own.append(target)
+                    undo(binding, trail, 0)
+            if not own:
+                return None
+            candidates.append(own)
+        return candidates
+
+    def arcConsistency(self, candidates: List[List[tuple]]) -> bool:
+        '''
+        Prunes candidates in place until every argument-level variable's domain, i.e. the set of target terms it can
+        take, is supported by a candidate of every pattern literal it occurs in. Counts the supporting candidates of
+        every value, so each candidate is removed at most once. Returns False if a candidate list becomes empty.
+        '''
+        # per literal, its argument-level variables with the first position they occur at
+        positions: List[Dict[tuple, int]] = []
+        occurrences: Dict[tuple, List[int]] = {}
+        for idx, (signature, arguments) in enumerate(self.pattern):
+            own = {}
+            for position, term in enumerate(arguments):
+                if term[0] == VARIABLE and term not in own:
+                    own[term] = position
+                    occurrences.setdefault(term, []).append(idx)
+            positions.append(own)
+
+        # supports[idx][variable][value] lists the candidates of literal idx binding the variable to the value
+        supports: List[Dict[tuple, Dict[tuple, List[int]]]] = []
+        for own, variables in zip(candidates, positions):
+            literal = {variable: {} for variable in variables}
+            for c, target in enumerate(own):
+                for variable, position in variables.items():
+                    literal[variable].setdefault(target[position], []).append(c)
+            supports.append(literal)
+        counts = [{variable: {value: len(cs) for value, cs in values.items()} for variable, values in literal.items()}
+                  for literal in supports]
+        alive = [[True] * len(own) for own in candidates]
+        remaining = [len(own) for own in candidates]
+
+        domains: Dict[tuple, set] = {}
+        for variable, literals in occurrences.items():
+            domains[variable] = set.intersection(*(set(supports[idx][variable]) for idx in literals))
+        removed = deque((variable, value) for variable, literals in occurrences.items()
+                        for idx in literals for value in supports[idx][variable] if value not in domains[variable])
+
+        while removed:
+            variable, value = removed.popleft()
+            for idx in occurrences[variable]:
+                own = candidates[idx]
+                for c in supports[idx][variable].get(value, ()):
+                    if not alive[idx][c]:
+                        continue
+                    alive[idx][c] = False
+                    remaining[idx] -= 1
+                    if not remaining[idx]:
+                        return False
+                    for other, position in positions[idx].items():
+                        lost = own[c][position]
+                        counts[idx][other][lost] -= 1
+                        if not counts[idx][other][lost] and lost in domains[other]:
+                            domains[other].discard(lost)
+                            removed.append((other, lost))
+
+        for own, flags in zip(candidates, alive):
+            if not all(flags):
+                own[:] = [target for target, flag in zip(own, flags) if flag]
+        return True
+
+    def search(self, candidates: List[List[tuple]]) -> bool:
+        '''
+        Backtracking over pattern literals with an explicit stack, always branching on the literal with the fewest
+        candidates compatible with the current binding (fail first), so literals left with a single candidate are
+        assigned before any branching. After each assignment only the candidates of unmatched literals sharing a
+        newly bound variable are filtered, the replaced candidate lists are kept on a trail to restore them on
+        backtracking.
+        '''
+        occurrences: Dict[tuple, List[int]] = {}
+        for idx, (signature, arguments) in enumerate(self.pattern):
+            variables = set()
+            for term in arguments:
+                termVariables(term, variables)
+            for variable in variables:
+                occurrences.setdefault(variable, []).append(idx)
+
+        options = [list(own) for own in candidates]
+        matched = [False] * len(options)
+        # (number of options, literal), entries outdated by a later change are skipped when popped
+        queue = [(len(own), idx) for idx, own in enumerate(options)]
+        heapify(queue)
+        binding: Dict[tuple, tuple] = {}
+        trail: List[tuple] = []
+        changes: List[Tuple[int, List[tuple]]] = []
+        # frames (literal, iterator over its remaining options, trail mark, changes mark)
+        stack = []
+
+        def select():
+            while queue:
+                count, idx = heappop(queue)
+                if not matched[idx] and len(options[idx]) == count:
+                    return idx
+            return None
+
+        def restore(changesMark):
+            while len(changes) > changesMark:
+                idx, previous = changes.pop()
+                options[idx] = previous
+                heappush(queue, (len(previous), idx))
+
+        def propagate(trailMark) -> bool:
+            affected = set()
+            for variable in trail[trailMark:]:
+                affected.update(idx for idx in occurrences.get(variable, ()) if not matched[idx])
+            for idx in affected:
+                arguments = self.pattern[idx][1]
+                compatible = []
+                for target in options[idx]:
+                    mark = len(trail)
+                    if matchArguments(arguments, target, binding, trail):
+                        compatible.append(target)
+                        undo(binding, trail, mark)
+                if len(compatible) < len(options[idx]):
+                    changes.append((idx, options[idx]))
+                    options[idx] = compatible
+                    heappush(queue, (len(compatible), idx))
+                    if not compatible:
+                        return False
+            return True
+
+        descend = True
+        while True:
+            if descend:
+                idx = select()
+                if idx is None:
+                    self.substitution = dict(binding)
+                    return True
+                matched[idx] = True
+                stack.append((idx, iter(options[idx]), len(trail), len(changes)))
+
+            idx, alternatives, trailMark, changesMark = stack[-1]
+            undo(binding, trail, trailMark)
+            restore(changesMark)
+            target = next(alternatives, None)
+            if target is None:
+                stack.pop()
+                matched[idx] = False
+                heappush(queue, (len(options[idx]), idx))
+                if not stack:
+                    return False
+                descend = False
+                continue
+
+            descend = matchArguments(self.pattern[idx][1], target, binding, trail) and propagate(trailMark)
+
+
+def thetaSubsumes(alpha: Clause, beta: Clause) -> bool:
+    '''
+    Returns true iff alpha theta-subsumes beta, i.e. there is a substitution theta such that alpha theta is a subset
+    of beta. Variables of beta are treated as constants.
+
+    :type alpha: Clause
+    :type beta: Clause
+    :rtype: bool
+    '''
+    return SubsumptionProblem(alpha, beta).solve()
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'negativeHits', 'misses', 'size', 'maxsize'])
+
+
+class SubsumptionCache:
+    '''
+    Bounded LRU cache of subsumption results keyed on the literal sets of both clauses (see Clause.getLiteralSet).
+
+    Negative results are reused by monotonicity: if alpha does not subsume beta, then neither does any clause having
+    all literals of alpha. Such queries are answered from the cache too and counted as negative hits.
+    '''
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize: int = maxsize
+        self.results: OrderedDict = OrderedDict()
+        # beta -> alphas known not to subsume it, kept in sync with results
+        self.negatives: Dict[FrozenSet, set] = {}
+        self.hits = self.negativeHits = self.misses = 0
+
+    def subsume(self, alpha: Clause, beta: Clause, decide: Callable[[Clause, Clause], bool] = thetaSubsumes) -> bool:
+        '''
+        Returns true iff alpha theta-subsumes beta, asking decide only if the cache cannot answer.
+
+        :type alpha: Clause
+        :type beta: Clause
+        :rtype: bool
+        '''
+        alphaKey, betaKey = alpha.getLiteralSet(), beta.getLiteralSet()
+        key = (alphaKey, betaKey)
+
+        result = self.results.get(key)
+        if result is not None:
+            self.results.move_to_end(key)
+            self.hits += 1
+            return result
+
+        for negative in self.negatives.get(betaKey, ()):
+            if negative <= alphaKey:
+                self.negativeHits += 1
+                return False
+
+        self.misses += 1
+        result = decide(alpha, beta)
+        self.store(key, result)
+        return result
+
+    def store(self, key: Tuple[FrozenSet, FrozenSet], result: bool):
+        self.results[key] = result
+        if not result:
+            self.negatives.setdefault(key[1], set()).add(key[0])
+        while len(self.results) > self.maxsize:
+            (alphaKey, betaKey), evicted = self.results.popitem(last=False)
+            if not evicted:
+                negatives = self.negatives[betaKey]
+                negatives.discard(alphaKey)
+                if not negatives:
+                    del self.negatives[betaKey]
+
+    def clear(self):
+        self.results.clear()
+        self.negatives.clear()
+        self.hits = self.negativeHits = self.misses = 0
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.negativeHits, self.misses, len(self.results), self.maxsize)
@@ -0,0 +1,204 @@
+from collections import namedtuple
+from time import time
+
+import numpy as np
+import pandas as pd
+
+from blackjack import DECK_RANKS, CARD_VALUES, sample_dealer_values
+from carddeck import Rank
+
+
+def hand_values(hard_values, num_of_aces):
+    '''
+    Vectorized blackjack.hand_value: one ace is counted 11 if the sum does not exceed 21.
+    '''
+    return hard_values + 10 * ((num_of_aces > 0) & (hard_values + 10 <= 21))
+
+
+class BatchObservation(namedtuple('BatchObservation', [
+        'player_hard_value', 'player_aces', 'dealer_card', 'dealer_hard_value', 'dealer_aces'])):
+    '''
+    Observation of BatchBlackjackEnv, the fields of blackjack.CompactObservation
+    as arrays with one entry per game.
+    '''
+    __slots__ = ()
+
+    @property
+    def player_value(self):
+        return hand_values(self.player_hard_value, self.player_aces)
+
+    @property
+    def player_non_aces_value(self):
+        return self.player_hard_value - self.player_aces
+
+    @property
+    def dealer_value(self):
+        return hand_values(self.dealer_hard_value, self.dealer_aces)
+
+
+class BatchBlackjackEnv:
+    '''
+    Steps n_games independent blackjack games in lockstep on numpy arrays.
+    Each game has its own deck and follows the rules of BlackjackEnv:
+    action 1 draws a card, action 0 sticks and lets the dealer draw to 17.
+
+    Decks are not shuffled up front, every draw performs one step of the
+    Fisher-Yates shuffle instead (swaps a uniformly chosen remaining card to
+    the top), so only the cards actually dealt cost any random numbers.
+
+    step() returns batched observations, rewards and done flags. Actions of
+    games that are already done are ignored and their reward is 0.
+
+    With dealer_table=True the dealer's final values are sampled from
+    blackjack.DEALER_OUTCOME_CDF (an infinite deck) as in FastBlackjackEnv.
+    '''
+
+    def __init__(self, n_games, seed=None, dealer_table=False):
+        self.n_games = n_games
+        self.dealer_table = dealer_table
+        self.np_random = np.random.RandomState(seed)
+        self.reset()
+
+    def _draw(self, games):
+        top = self.top[games]
+        chosen = top + (self.np_random.rand(len(games)) * (len(DECK_RANKS) - top)).astype(np.intp)
+        ranks = self.decks[games, chosen]
+        self.decks[games, chosen] = self.decks[games, top]
+        self.decks[games, top] = ranks
+        self.top[games] += 1
+        return ranks
+
+    def _player_draw(self, games):
+        ranks = self._draw(games)
+        self.player_hard_value[games] += CARD_VALUES[ranks]
+        self.player_aces[games] += ranks == 1
+
+    def _dealer_draw(self, games):
+        ranks = self._draw(games)
+        self.dealer_hard_value[games] += CARD_VALUES[ranks]
+        self.dealer_aces[games] += ranks == 1
+        return ranks
+
+    def reset(self):
+        '''
+        Starts n_games new games, each with a freshly shuffled deck.
+        '''
+        self.decks = np.tile(DECK_RANKS, (self.n_games, 1))
+        self.top = np.zeros(self.n_games, dtype=np.intp)
+
+        self.player_hard_value = np.zeros(self.n_games, dtype=np.int16)
+        self.player_aces = np.zeros(self.n_games, dtype=np.int8)
+        self.dealer_hard_value = np.zeros(self.n_games, dtype=np.int16)
+        self.dealer_aces = np.zeros(self.n_games, dtype=np.int8)
+        self.done = np.zeros(self.n_games, dtype=bool)
+
+        everyone = np.arange(self.n_games)
+        self._player_draw(everyone)
+        self._player_draw(everyone)
+        self.dealer_card = self._dealer_draw(everyone)
+        return self._get_observation()
+
+    def step(self, actions):
+        '''
+        :param actions: One action per game, 1 draws a card, 0 sticks.
+        :return: observation (BatchObservation), rewards, done flags and an empty info dictionary
+        '''
+        actions = np.asarray(actions)
+        rewards = np.zeros(self.n_games, dtype=np.int8)
+        active = ~self.done
+
+        hitting = np.flatnonzero(active & (actions == 1))
+        self._player_draw(hitting)
+        bust = hitting[self.player_hard_value[hitting] > 21]
+        rewards[bust] = -1
+        self.done[bust] = True
+
+        standing = np.flatnonzero(active & (actions == 0))
+        if self.dealer_table:
+            self.dealer_hard_value[standing] = sample_dealer_values(self.dealer_card[standing], self.np_random)
+            self.dealer_aces[standing] = 0
+        drawing = standing
+        while len(drawing):
+            drawing = drawing[hand_values(self.dealer_hard_value[drawing], self.dealer_aces[drawing]) < 17]
+            self._dealer_draw(drawing)
+
+        player_values = hand_values(self.player_hard_value[standing], self.player_aces[standing])
+        dealer_values = hand_values(self.dealer_hard_value[standing], self.dealer_aces[standing])
+        rewards[standing] = np.where(dealer_values > 21, 1, np.sign(player_values - dealer_values))
+        self.done[standing] = True
+
+        return self._get_observation(), rewards, self.done.copy(), {}
+
+    def _get_observation(self):
+        return BatchObservation(self.player_hard_value.copy(), self.player_aces.copy(), self.dealer_card.copy(),
+                                self.dealer_hard_value.copy(), self.dealer_aces.copy())
+
+
+class TablePolicy:
+    '''
+    Fixed policy given by a table of actions indexed by
+    [dealer card (1-10), non-aces value of the player, number of player's aces].
+    '''
+    MAX_NON_ACES_VALUE = 31
+    MAX_ACES = 4
+
+    def __init__(self, table):
+        self.table = table
+
+    @classmethod
+    def dealer(cls):
+        '''
+        The dealer's strategy: draw while the hand value is below 17.
+        '''
+        non_aces_value = np.arange(cls.MAX_NON_ACES_VALUE + 1)[:, None]
+        aces = np.arange(cls.MAX_ACES + 1)[None, :]
+        actions = (hand_values(non_aces_value + aces, aces) < 17).astype(np.int8)
+        return cls(np.broadcast_to(actions, (11,) + actions.shape).copy())
+
+    @classmethod
+    def from_csv(cls, path, default=None):
+        '''
+        Loads a strategy written by evaluate.print_policy, e.g. final_strategy.csv.
+        States missing in the file ('-') play the default policy, the dealer's strategy if None.
+        '''
+        policy = (default or cls.dealer()).table.copy()
+        strategy = pd.read_csv(path, index_col=[0, 1])
+        for column in strategy.columns:
+            dealer_card = Rank[column.split('.')[-1]].value
+            for (non_aces_value, num_of_aces), action in strategy[column].items():
+                if action in ('HIT', 'STAND'):
+                    policy[dealer_card, non_aces_value, num_of_aces] = action == 'HIT'
+        return cls(policy)
+
+    def __call__(self, observation):
+        dealer_card = np.minimum(observation.dealer_card, 10)
+        non_aces_value = np.minimum(observation.player_non_aces_value, self.MAX_NON_ACES_VALUE)
+        num_of_aces = np.minimum(observation.player_aces, self.MAX_ACES)
+        return self.table[dealer_card, non_aces_value, num_of_aces]
+
+
+def evaluate_policy(policy, n_hands, batch_size=100000, seed=None, dealer_table=False):
+    '''
+    Plays n_hands games with a fixed policy and returns the rewards of all games.
+
+    :param policy: callable mapping a BatchObservation to an array of actions
+    :param dealer_table: sample the dealer's final values instead of playing the dealer out
+    '''
+    env = BatchBlackjackEnv(min(batch_size, n_hands), seed, dealer_table)
+    rewards = []
+    while len(rewards) * env.n_games < n_hands:
+        observation = env.reset()
+        total = np.zeros(env.n_games, dtype=np.int8)
+        done = env.done
+        while not done.all():
+            observation, reward, done, _ = env.step(policy(observation))
+            total += reward
+        rewards.append(total)
+    return np.concatenate(rewards)[:n_hands]
+
+
+if __name__ == "__main__":
+    start = time()
+    rewards = evaluate_policy(TablePolicy.from_csv("final_strategy.csv"), 1000000)
+    elapsed = time() - start
+    print("Average reward: %.4f (%d hands, %.0f hands/s)" % (rewards.mean(), len(rewards), len(rewards) / elapsed))
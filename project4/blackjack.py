@@ -3,7 +3,10 @@ from gym import spaces
 from gym import Space
 from gym.utils import seeding
 from carddeck import *
+from collections import namedtuple
+from functools import lru_cache
 import copy
+import numpy as np
 
 class BlackjackEnv(gym.Env):
     '''
@@ -106,5 +109,203 @@ class BlackjackObservation(Space):
         self.player_hand = player_hand
         self.dealer_hand = dealer_hand
 
+    # the fields of CompactObservation, read from the running totals of the hands
+
+    @property
+    def player_hard_value(self):
+        return self.player_hand.hard_value
+
+    @property
+    def player_aces(self):
+        return self.player_hand.num_of_aces
+
+    @property
+    def player_value(self):
+        return self.player_hand.value()
+
+    @property
+    def player_non_aces_value(self):
+        return self.player_hand.hard_value - self.player_hand.num_of_aces
+
+    @property
+    def dealer_card(self):
+        return self.dealer_hand.cards[0].rank.value
+
+    @property
+    def dealer_hard_value(self):
+        return self.dealer_hand.hard_value
+
+    @property
+    def dealer_aces(self):
+        return self.dealer_hand.num_of_aces
+
+    @property
+    def dealer_value(self):
+        return self.dealer_hand.value()
+
     def __repr__(self):
         return "Blackjack(player: "+str(self.player_hand)+", dealer: "+str(self.dealer_hand)+")"
+
+
+def hand_value(hard_value, num_of_aces):
+    '''
+    Value of a hand given the sum of its cards with aces counted 1 and
+    the number of aces. One ace is counted 11 if the sum does not exceed 21,
+    exactly as in BlackjackHand.value().
+    '''
+    if num_of_aces and hard_value + 10 <= 21:
+        return hard_value + 10
+    return hard_value
+
+
+# final dealer values, 22 stands for any bust
+DEALER_OUTCOMES = (17, 18, 19, 20, 21, 22)
+# probability of drawing a card of the given value (ace 1, faces 10) from an infinite deck
+CARD_PROBABILITIES = {value: (4 if value == 10 else 1) / 13 for value in range(1, 11)}
+
+
+@lru_cache(maxsize=None)
+def dealer_final_distribution(hard_value, has_ace):
+    '''
+    Probabilities of DEALER_OUTCOMES when the dealer holds a hand with the given
+    hard value and draws to 17 from an infinite deck. Only the presence of an
+    ace matters for the rest of the game, so the result is memoized on it.
+    '''
+    value = hand_value(hard_value, has_ace)
+    if value >= 17:
+        return tuple(float(min(value, 22) == outcome) for outcome in DEALER_OUTCOMES)
+
+    distribution = [0.0] * len(DEALER_OUTCOMES)
+    for card_value, p in CARD_PROBABILITIES.items():
+        after = dealer_final_distribution(hard_value + card_value, has_ace or card_value == 1)
+        for i, q in enumerate(after):
+            distribution[i] += p * q
+    return tuple(distribution)
+
+
+def dealer_upcard_distribution(dealer_card):
+    '''
+    Probabilities of DEALER_OUTCOMES given the dealer's visible card (rank value 1-13).
+    '''
+    card_value = min(dealer_card, 10)
+    return dealer_final_distribution(card_value, card_value == 1)
+
+
+# ranks of a fresh deck in the same order as CardDeck creates the cards
+DECK_RANKS = np.tile(np.arange(1, 14, dtype=np.int8), len(Suit))
+# value of a card by its rank, index 0 is unused
+CARD_VALUES = np.minimum(np.arange(14, dtype=np.int8), 10)
+# cumulative probabilities of DEALER_OUTCOMES by the rank of the dealer's visible card, row 0 is unused
+DEALER_OUTCOME_CDF = np.vstack([np.zeros(len(DEALER_OUTCOMES))] +
+                               [np.cumsum(dealer_upcard_distribution(rank)) for rank in range(1, 14)])
+DEALER_OUTCOME_CDF[:, -1] = 1.0
+
+
+def sample_dealer_values(dealer_cards, np_random):
+    '''
+    Draws the dealer's final values (22 for a bust) given the ranks of the
+    dealer's visible cards, one table lookup and one random number per card.
+    Accepts a single rank or an array of them.
+    '''
+    u = np.asarray(np_random.rand(*np.shape(dealer_cards)))
+    return np.array(DEALER_OUTCOMES)[(DEALER_OUTCOME_CDF[dealer_cards] <= u[..., None]).sum(axis=-1)]
+
+
+class CompactObservation(namedtuple('CompactObservation', [
+        'player_hard_value', 'player_aces', 'dealer_card', 'dealer_hard_value', 'dealer_aces'])):
+    '''
+    Immutable observation of FastBlackjackEnv made of small ints.
+    Hard values count every ace 1, dealer_card is the rank value (1-13)
+    of the dealer's first card.
+    '''
+    __slots__ = ()
+
+    @property
+    def player_value(self):
+        return hand_value(self.player_hard_value, self.player_aces)
+
+    @property
+    def player_non_aces_value(self):
+        return self.player_hard_value - self.player_aces
+
+    @property
+    def dealer_value(self):
+        return hand_value(self.dealer_hard_value, self.dealer_aces)
+
+
+class FastBlackjackEnv(BlackjackEnv):
+    '''
+    High-throughput variant of BlackjackEnv with the same rules and the same
+    step/reset contract. Hands are kept as ints, the deck is a numpy int8
+    array of ranks and observations are CompactObservation tuples, so nothing
+    is deep-copied. Given the same seed it deals the same cards as BlackjackEnv.
+
+    With dealer_table=True a stand does not play out the dealer's hand, the
+    dealer's final value is sampled from DEALER_OUTCOME_CDF instead. The table
+    assumes an infinite deck, so the game differs slightly from the one dealt
+    from the env's deck. The observed dealer hand then has the final value as
+    its hard value (22 for a bust) and no aces.
+    '''
+
+    def __init__(self, dealer_table=False):
+        self.dealer_table = dealer_table
+        super().__init__()
+
+    def _draw(self):
+        rank = self.deck[self.top]
+        self.top -= 1
+        return int(rank)
+
+    def _player_draw(self):
+        rank = self._draw()
+        self.player_hard_value += CARD_VALUES[rank]
+        self.player_aces += rank == 1
+
+    def _dealer_draw(self):
+        rank = self._draw()
+        self.dealer_hard_value += CARD_VALUES[rank]
+        self.dealer_aces += rank == 1
+        return rank
+
+    def step(self, action):
+        assert self.action_space.contains(action)
+
+        if action == 1:
+            self._player_draw()
+            if self.player_hard_value > 21:
+                return self._get_observation(), -1, True, {}
+            else:
+                return self._get_observation(), 0, False, {}
+        else:
+            # now play the dealer
+            if self.dealer_table:
+                self.dealer_hard_value = int(sample_dealer_values(self.dealer_card, self.np_random))
+                self.dealer_aces = 0
+            while hand_value(self.dealer_hard_value, self.dealer_aces) < 17:
+                self._dealer_draw()
+            player_value = hand_value(self.player_hard_value, self.player_aces)
+            dealer_value = hand_value(self.dealer_hard_value, self.dealer_aces)
+            if player_value > dealer_value or dealer_value > 21:
+                return self._get_observation(), 1, True, {}
+            if player_value < dealer_value:
+                return self._get_observation(), -1, True, {}
+            return self._get_observation(), 0, True, {}
+
+    def reset(self):
+        self.deck = DECK_RANKS.copy()
+        self.np_random.shuffle(self.deck)
+        self.top = len(self.deck) - 1
+        self.player_hard_value = self.player_aces = 0
+        self.dealer_hard_value = self.dealer_aces = 0
+        self._player_draw()
+        self._player_draw()
+        self.dealer_card = self._dealer_draw()
+        return self._get_observation()
+
+    def render(self, mode='human', close=False):
+        print("player: %d (%d aces)" % (hand_value(self.player_hard_value, self.player_aces), self.player_aces))
+        print("dealer: %d (%d aces)" % (hand_value(self.dealer_hard_value, self.dealer_aces), self.dealer_aces))
+
+    def _get_observation(self):
+        return CompactObservation(int(self.player_hard_value), int(self.player_aces), self.dealer_card,
+                                  int(self.dealer_hard_value), int(self.dealer_aces))
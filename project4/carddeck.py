@@ -78,12 +78,19 @@ class BlackjackHand:
     '''
     def __init__(self):
         self.cards = []
+        # sum of the cards with aces counted 1 and the number of aces, kept up to date by draw_card
+        self.hard_value = 0
+        self.num_of_aces = 0
 
     def draw_card(self, deck):
         '''
         Takes one card from the card deck.
         '''
-        self.cards.append(deck.draw_card())
+        card = deck.draw_card()
+        self.cards.append(card)
+        self.hard_value += card.value()
+        if card.rank is Rank.ACE:
+            self.num_of_aces += 1
 
     def value(self):
         '''
@@ -91,23 +98,16 @@ class BlackjackHand:
         in the deck. If there is an ace, it can be counted 1 or 11. 11 is
         used only if the final sum does not exceed 21.
         '''
-        ace = False
-        value = 0
-        for card in self.cards:
-            if card.rank is Rank.ACE:
-                ace = True
-            value += card.value()
-
-        if ace and value + 10 <= 21:
-            value = value + 10
-        return value
+        if self.num_of_aces and self.hard_value + 10 <= 21:
+            return self.hard_value + 10
+        return self.hard_value
 
     def is_bust(self):
         '''
         Hand is bust if the value is more than 21. This is equivallent to
         loosing a blackjack game.
         '''
-        return self.value() > 21
+        return self.hard_value > 21
 
     def __str__(self):
         return str(self.cards) + " ("+str(self.value())+")"
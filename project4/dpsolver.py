@@ -0,0 +1,118 @@
+from functools import lru_cache
+from time import time
+
+from blackjack import hand_value, dealer_upcard_distribution, DEALER_OUTCOMES, CARD_PROBABILITIES
+from carddeck import Rank
+from states import DealerValueAcesState
+from state_mappings import StateMapping, StateActionMapping, DealerValueAcesEncoder
+from sarsaagent import SarsaAgent
+
+
+class BlackjackSolver:
+    '''
+    Exact solution of the blackjack MDP over DealerValueAcesState by
+    expectimax. Cards are drawn from an infinite deck (ace to nine 1/13 each,
+    ten-valued 4/13), which is what DealerValueAcesState can express, as it
+    does not track the composition of the deck. The dealer's final values
+    come from the memoized per-upcard distributions of blackjack.
+
+    Rewards and the discount follow SarsaAgent, gamma defaults to
+    SarsaAgent.GAMMA so that the values are comparable with its learned
+    tables: standing ends the game with its reward, a bust is -1 and any
+    other hit is worth gamma times the value of the next state. With
+    gamma=1.0 the values are the expected rewards of the game. After solve(), utility holds Q values indexed
+    by (state, action) with 0 = STAND and 1 = HIT, values holds state values.
+    '''
+
+    def __init__(self, gamma=SarsaAgent.GAMMA):
+        self.gamma = gamma
+        self.utility = StateActionMapping(2)
+        self.values = StateMapping()
+        self.q_values = lru_cache(maxsize=None)(self._q_values)
+
+    def stand_value(self, dealer_card, non_aces_value, num_of_aces):
+        player_value = hand_value(non_aces_value + num_of_aces, num_of_aces)
+        expected = 0.0
+        for outcome, p in zip(DEALER_OUTCOMES, dealer_upcard_distribution(dealer_card)):
+            if outcome == 22 or player_value > outcome:
+                expected += p
+            elif player_value < outcome:
+                expected -= p
+        return expected
+
+    def _q_values(self, dealer_card, non_aces_value, num_of_aces):
+        hit = 0.0
+        for card_value, p in CARD_PROBABILITIES.items():
+            if card_value == 1:
+                next_state = (non_aces_value, num_of_aces + 1)
+            else:
+                next_state = (non_aces_value + card_value, num_of_aces)
+            if sum(next_state) > 21:
+                hit -= p
+            else:
+                hit += p * self.gamma * max(self.q_values(dealer_card, *next_state))
+        return self.stand_value(dealer_card, non_aces_value, num_of_aces), hit
+
+    def solve(self):
+        '''
+        Fills utility and values for every non-terminal state DealerValueAcesEncoder can encode.
+        '''
+        encoder = DealerValueAcesEncoder()
+        for dealer_card in range(1, encoder.DEALER_CARDS + 1):
+            for non_aces_value in range(encoder.NON_ACES_VALUES):
+                for num_of_aces in range(encoder.ACES):
+                    if non_aces_value + num_of_aces > 21:
+                        continue
+                    state = DealerValueAcesState(Rank(dealer_card), non_aces_value, num_of_aces)
+                    q = self.q_values(dealer_card, non_aces_value, num_of_aces)
+                    self.utility[(state, 0)], self.utility[(state, 1)] = q
+                    self.values[state] = max(q)
+        return self
+
+    def policy(self, state):
+        return self.utility.best_action(state)
+
+    def expected_return(self):
+        '''
+        Expected discounted return of the optimal policy over all initial
+        deals, the expected reward for gamma=1.0.
+        '''
+        expected = 0.0
+        for dealer_card, p_dealer in CARD_PROBABILITIES.items():
+            for first, p_first in CARD_PROBABILITIES.items():
+                for second, p_second in CARD_PROBABILITIES.items():
+                    num_of_aces = (first == 1) + (second == 1)
+                    non_aces_value = first + second - num_of_aces
+                    expected += p_dealer * p_first * p_second * \
+                                max(self.q_values(dealer_card, non_aces_value, num_of_aces))
+        return expected
+
+    def compare(self, utility):
+        '''
+        Fraction of the DealerValueAcesStates in a learned utility mapping
+        whose greedy action agrees with the optimal one. States where the
+        optimal actions are tied count as agreeing.
+        '''
+        agree = total = 0
+        for state in utility.keys():
+            if type(state) is not DealerValueAcesState:
+                continue
+            stand, hit = self.q_values(state.dealer_card.value, state.non_aces_value, state.num_of_aces)
+            total += 1
+            agree += stand == hit or utility.best_action(state) == (1 if hit > stand else 0)
+        return agree / total if total else 1.0
+
+
+if __name__ == "__main__":
+    start = time()
+    solver = BlackjackSolver().solve()
+    print("Solved in %.3f s" % (time() - start))
+    print("Expected return of the optimal policy: %.4f" % solver.expected_return())
+
+    for num_of_aces in range(2):
+        print("HIT (H) / STAND (S) with %d aces, rows are non-ace values, columns dealer cards:" % num_of_aces)
+        print("     " + " ".join("%2d" % d for d in range(1, 11)))
+        for non_aces_value in range(2, 21 - num_of_aces + 1):
+            row = ["%2s" % ("H" if solver.policy(DealerValueAcesState(Rank(d), non_aces_value, num_of_aces)) else "S")
+                   for d in range(1, 11)]
+            print("%4d " % non_aces_value + " ".join(row))
@@ -1,5 +1,6 @@
 import matplotlib
 import pandas as pd
+from qlearningagent import QLearningAgent
 from sarsaagent import SarsaAgent
 from states import DealerValueAcesState
 
@@ -9,12 +10,12 @@ import numpy as np
 
 
 def print_policy(agent):
-    if not isinstance(agent, SarsaAgent):
+    if not isinstance(agent, (SarsaAgent, QLearningAgent)):
         return
 
     d = {}
 
-    for state in agent.utility.d.keys():
+    for state in agent.utility.keys():
         actions = agent.utility.get_action_utility(state)
 
         if type(state) is not DealerValueAcesState:
@@ -36,6 +37,17 @@ def print_policy(agent):
     df.to_csv("strategy.csv")
 
 
+def evaluate_metrics(metrics, agent=None):
+    '''
+    Counterpart of evaluate() for agents that stream their statistics
+    to a metrics.MetricsCollector instead of keeping every reward.
+    '''
+    metrics.close(agent)
+    print(metrics)
+    if metrics.path is not None:
+        print("Metrics written to %s" % metrics.path)
+
+
 def evaluate(rewards, agent=None):
     # TODO implement your own code here if you want to
     # or alternatively you can modify the existing code
@@ -58,7 +70,7 @@ def evaluate(rewards, agent=None):
         # print(agent.utility)
         print()
 
-    if hasattr(agent, "observed_state"):
+    if getattr(agent, "observed_state", None) is not None:
         print("observed_state")
         observed_state = agent.observed_state
         plt.show()
@@ -74,14 +86,8 @@ def evaluate(rewards, agent=None):
 
 # check Wikipedia: https://en.wikipedia.org/wiki/Moving_average
 def simple_moving_average(x, N):
-    mean = np.zeros(len(x) - N + 1)
-    sum = np.sum(x[0:N])
-    for i in range(len(mean) - 1):
-        mean[i] = sum
-        sum -= x[i]
-        sum += x[i + N]
-    mean[len(mean) - 1] = sum
-    return mean / N
+    sums = np.cumsum(np.concatenate(([0.0], np.asarray(x, dtype=float))))
+    return (sums[N:] - sums[:-N]) / N
 
 
 # check Wikipedia: https://en.wikipedia.org/wiki/Moving_average
@@ -0,0 +1,122 @@
+from collections import deque
+
+import numpy as np
+
+from carddeck import Rank
+from states import DealerValueAcesState
+
+# Q values plotted by main.py, name -> (state, action)
+DEFAULT_TRACKED = {
+    "four_21_stand": (DealerValueAcesState(Rank.FOUR, 21, 0), 0),
+    "four_21_hit": (DealerValueAcesState(Rank.FOUR, 21, 0), 1),
+    "ace_5_ace_stand": (DealerValueAcesState(Rank.ACE, 5, 1), 0),
+    "ace_5_ace_hit": (DealerValueAcesState(Rank.ACE, 5, 1), 1),
+}
+
+
+class MetricsCollector:
+    '''
+    Streaming training statistics: a simple moving average over the last
+    sma_window rewards, an exponential moving average, win/loss/tie rates
+    and tracked Q values, kept with memory independent of the number of
+    episodes. Every stride episodes one row is taken into preallocated
+    numpy columns, one float64 per metric and row. If a path is given, the columns are written to it with
+    np.savez every flush_every rows and on close, np.load(path) reads them
+    back. Given n_episodes the columns are allocated once, otherwise their
+    capacity doubles when they are full.
+    '''
+
+    def __init__(self, path=None, stride=1000, sma_window=40, ema_alpha=0.2, tracked=None, flush_every=100,
+                 n_episodes=None):
+        self.path = path
+        self.stride = stride
+        self.sma_window = sma_window
+        self.ema_alpha = ema_alpha
+        self.tracked = DEFAULT_TRACKED if tracked is None else tracked
+        self.flush_every = flush_every
+
+        self.columns = ["episode", "sma", "ema", "average", "win_rate", "loss_rate", "tie_rate"] + list(self.tracked)
+        self.episodes = 0
+        self.wins = self.losses = self.ties = 0
+        self.total = 0.0
+        self.window = deque(maxlen=sma_window)
+        self.window_sum = 0.0
+        self.ema = None
+        self.last_row = None
+
+        capacity = flush_every if n_episodes is None else -(-n_episodes // stride) + 1
+        self.data = np.empty((len(self.columns), max(capacity, 1)))
+        self.n_rows = 0
+        self._unflushed = 0
+
+    def record(self, reward, agent=None):
+        '''
+        Adds the final reward of one episode. The agent's utility is read for
+        the tracked Q values when a row is sampled.
+        '''
+        self.episodes += 1
+        self.total += reward
+        if reward > 0:
+            self.wins += 1
+        elif reward < 0:
+            self.losses += 1
+        else:
+            self.ties += 1
+
+        if len(self.window) == self.sma_window:
+            self.window_sum -= self.window[0]
+        self.window.append(reward)
+        self.window_sum += reward
+        self.ema = reward if self.ema is None else self.ema_alpha * reward + (1.0 - self.ema_alpha) * self.ema
+
+        if self.episodes % self.stride == 0:
+            self.sample(agent)
+
+    def sample(self, agent=None):
+        row = [self.episodes, self.window_sum / len(self.window), self.ema, self.total / self.episodes,
+               self.wins / self.episodes, self.losses / self.episodes, self.ties / self.episodes]
+        for key in self.tracked.values():
+            row.append(agent.utility[key] if agent is not None else float("nan"))
+        self.last_row = dict(zip(self.columns, row))
+
+        if self.n_rows == self.data.shape[1]:
+            self.data = np.concatenate((self.data, np.empty_like(self.data)), axis=1)
+        self.data[:, self.n_rows] = row
+        self.n_rows += 1
+
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every:
+            self.flush()
+
+    def column(self, name):
+        '''
+        The sampled values of one metric.
+        '''
+        return self.data[self.columns.index(name), :self.n_rows]
+
+    def flush(self):
+        if self.path is None:
+            return
+        with open(self.path, "wb") as f:
+            np.savez(f, **{name: self.data[i, :self.n_rows] for i, name in enumerate(self.columns)})
+        self._unflushed = 0
+
+    def close(self, agent=None):
+        '''
+        Samples the last episodes if they do not end on a stride and writes the columns.
+        '''
+        if self.episodes and (self.last_row is None or self.last_row["episode"] != self.episodes):
+            self.sample(agent)
+        if self._unflushed:
+            self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __str__(self):
+        if self.last_row is None:
+            return "No episodes recorded."
+        return "\n".join("%s: %.5g" % item for item in self.last_row.items())
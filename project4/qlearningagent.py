@@ -0,0 +1,106 @@
+import numpy as np
+
+from carddeck import *
+from states import DealerValueAcesState
+from state_mappings import DenseStateActionMapping
+from replay import ReplayBuffer, q_learning_update, collect_transitions
+
+
+class QLearningAgent:
+    '''
+    Off-policy Q-learning from an experience replay buffer. train() plays
+    episodes on env epsilon-greedily, stores every transition in the buffer
+    and after each episode learns from updates_per_episode random batches.
+    Transitions can also come in bulk from a BatchBlackjackEnv
+    (train_batch) or from a buffer logged by an earlier run (learn).
+    '''
+
+    def __init__(self, env, number_of_epochs, capacity=100000, batch_size=32, updates_per_episode=1, epsilon=0.1,
+                 metrics=None):
+        self.env = env
+        self.number_of_epochs = number_of_epochs
+
+        self.state_factory = DealerValueAcesState
+        self.utility = DenseStateActionMapping(2)
+        self.na_visits = DenseStateActionMapping(2)
+        self.encoder = self.utility.encoder
+
+        self.buffer = ReplayBuffer(capacity)
+        self.batch_size = batch_size
+        self.updates_per_episode = updates_per_episode
+        self.epsilon = epsilon
+        self.gamma = 0.9
+
+        self.is_training = True
+        self.verbose = True
+
+        # per-episode statistics are kept in lists unless a metrics.MetricsCollector streams them
+        self.metrics = metrics
+        if metrics is None:
+            self.observed_state = {i: [0] * self.number_of_epochs for i in range(4)}
+            self.episode_rewards = [0] * self.number_of_epochs
+        else:
+            self.observed_state = self.episode_rewards = None
+
+    def train(self):
+        for i in range(self.number_of_epochs):
+            if self.verbose and i % 1000 == 0:
+                print(i)
+
+            observation = self.env.reset()
+            terminal = False
+            reward = 0
+            state = self.state_factory.from_observation(observation, reward, terminal)
+
+            while not terminal:
+                action = self.make_step(state)
+                observation, reward, terminal, _ = self.env.step(action)
+                next_state = self.state_factory.from_observation(observation, reward, terminal)
+
+                self.buffer.add(self.encoder.encode(state), action, reward, self.encoder.encode(next_state), terminal)
+                state = next_state
+
+            self.learn(self.updates_per_episode)
+
+            self.record_episode(i, reward)
+
+    def record_episode(self, i, reward):
+        if self.metrics is not None:
+            self.metrics.record(reward, self)
+            return
+
+        self.episode_rewards[i] = reward
+        self.observed_state[0][i] = self.utility[(self.state_factory(Rank.FOUR, 21, 0), 0)]
+        self.observed_state[1][i] = self.utility[(self.state_factory(Rank.FOUR, 21, 0), 1)]
+        self.observed_state[2][i] = self.utility[(self.state_factory(Rank.ACE, 5, 1), 0)]
+        self.observed_state[3][i] = self.utility[(self.state_factory(Rank.ACE, 5, 1), 1)]
+
+    def train_batch(self, batch_env, n_rounds, updates_per_round=None):
+        '''
+        Fills the buffer from a batchblackjack.BatchBlackjackEnv, one round of
+        batch_env.n_games games at a time, and learns after every round.
+        :return: rewards of all games played
+        '''
+        rewards = []
+        for _ in range(n_rounds):
+            rewards.append(collect_transitions(batch_env, self.utility, self.buffer, self.epsilon))
+            self.learn(updates_per_round or max(1, batch_env.n_games // self.batch_size))
+        return np.concatenate(rewards)
+
+    def learn(self, n_updates, buffer=None):
+        '''
+        Performs n_updates batch Q-learning updates sampled from the buffer,
+        by default the agent's own.
+        '''
+        if buffer is None:
+            buffer = self.buffer
+        if not len(buffer):
+            return
+        for _ in range(n_updates):
+            q_learning_update(self.utility, self.na_visits, buffer.sample(self.batch_size), self.gamma)
+
+    def make_step(self, state):
+        if self.is_training and self.epsilon > self.env.unwrapped.np_random.rand():
+            return self.env.action_space.sample()
+        else:  # we go greedy
+            return self.utility.best_action(state)
@@ -0,0 +1,129 @@
+import numpy as np
+
+
+class ReplayBuffer:
+    '''
+    Ring buffer of transitions (state index, action, reward, next state index,
+    done) stored in numpy arrays. States are indices of an encoder such as
+    state_mappings.DealerValueAcesEncoder. When full, the oldest transitions
+    are overwritten.
+    '''
+    FIELDS = ('states', 'actions', 'rewards', 'next_states', 'dones')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.states = np.zeros(capacity, dtype=np.int32)
+        self.actions = np.zeros(capacity, dtype=np.int8)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros(capacity, dtype=np.int32)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.position = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, reward, next_state, done):
+        self.add_batch([state], [action], [reward], [next_state], [done])
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        n = len(states)
+        if n > self.capacity:
+            # only the newest transitions would survive anyway
+            states, actions, rewards, next_states, dones = (
+                np.asarray(a)[-self.capacity:] for a in (states, actions, rewards, next_states, dones))
+            n = self.capacity
+
+        positions = (self.position + np.arange(n)) % self.capacity
+        self.states[positions] = states
+        self.actions[positions] = actions
+        self.rewards[positions] = rewards
+        self.next_states[positions] = next_states
+        self.dones[positions] = dones
+
+        self.position = (self.position + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def sample(self, batch_size, np_random=np.random):
+        '''
+        Uniformly samples batch_size transitions with replacement.
+        :return: tuple of arrays in the order of FIELDS
+        '''
+        indices = np_random.randint(self.size, size=batch_size)
+        return tuple(getattr(self, field)[indices] for field in self.FIELDS)
+
+    def save(self, path):
+        '''
+        Writes the stored transitions, oldest first, to an .npz file.
+        '''
+        order = (self.position - self.size + np.arange(self.size)) % self.capacity
+        np.savez_compressed(path, **{field: getattr(self, field)[order] for field in self.FIELDS})
+
+    @classmethod
+    def load(cls, path, capacity=None):
+        '''
+        Reads transitions written by save(), e.g. logged episodes of earlier runs.
+        '''
+        data = np.load(path)
+        buffer = cls(capacity or len(data['states']))
+        buffer.add_batch(*(data[field] for field in cls.FIELDS))
+        return buffer
+
+
+def q_learning_update(utility, na_visits, batch, gamma, c=2):
+    '''
+    Vectorized Q-learning update of dense state-action mappings with a batch
+    of transitions. Every state-action pair of the batch moves towards
+    r + gamma * max_a' Q(s', a') (just r for terminal transitions) by the
+    step size c / (c - 1 + n(s, a)) used by SarsaAgent. Targets are computed
+    from the Q values before the update and the TD errors of transitions
+    hitting the same pair are averaged, so the step never exceeds one.
+    '''
+    states, actions, rewards, next_states, dones = batch
+    values = utility.values
+
+    pairs = states.astype(np.intp) * values.shape[1] + actions
+    unique_pairs, inverse, counts = np.unique(pairs, return_inverse=True, return_counts=True)
+
+    targets = rewards + gamma * np.where(dones, 0, values[next_states].max(axis=1))
+    mean_errors = np.bincount(inverse, weights=targets - values[states, actions]) / counts
+
+    visits = na_visits.values.reshape(-1)
+    visits[unique_pairs] += counts
+    values.reshape(-1)[unique_pairs] += c / (c - 1 + visits[unique_pairs]) * mean_errors
+
+    utility.visited[states] = True
+    na_visits.visited[states] = True
+
+
+def collect_transitions(env, utility, buffer, epsilon=0.1):
+    '''
+    Plays one round of games of a batchblackjack.BatchBlackjackEnv epsilon-greedily
+    with respect to a dense utility mapping and stores all transitions in the buffer.
+    :return: total reward of every game
+    '''
+    encoder = utility.encoder
+
+    def encode(observation):
+        # games that are already over may hold bust hands, clip them into the encoder's range
+        return encoder.encode_batch(observation.dealer_card,
+                                    np.minimum(observation.player_non_aces_value, encoder.NON_ACES_VALUES - 1),
+                                    np.minimum(observation.player_aces, encoder.ACES - 1))
+
+    observation = env.reset()
+    done = env.done.copy()
+    total = np.zeros(env.n_games)
+
+    while not done.all():
+        states = encode(observation)
+        explore = env.np_random.rand(env.n_games) < epsilon
+        actions = np.where(explore, env.np_random.randint(2, size=env.n_games), utility.argmax(states))
+
+        active = np.flatnonzero(~done)
+        observation, rewards, done, _ = env.step(actions)
+        total += rewards
+
+        next_states = np.where(done, encoder.encode_terminal(rewards), encode(observation))
+        buffer.add_batch(states[active], actions[active], rewards[active], next_states[active], done[active])
+
+    return total
@@ -1,10 +1,18 @@
-from states import State
+from math import inf
+
+import numpy as np
+
+from carddeck import Rank
+from states import State, DealerValueAcesState, TerminalState, InitialState
 
 
 class StateMapping:
     def __init__(self):
         self.d = {}
 
+    def keys(self):
+        return self.d.keys()
+
     def __setitem__(self, key: State, value):
         self.d[key] = value
 
@@ -50,9 +58,163 @@ class StateActionMapping:
 
         return self.d[state]
 
+    def best_action(self, state):
+        best_utility = - inf
+        best_action = None
+
+        for action, utility in self.get_action_utility(state).items():
+            if utility > best_utility:
+                best_action = action
+                best_utility = utility
+
+        return best_action
+
+    def keys(self):
+        return self.d.keys()
+
     def __str__(self):
         l = []
         for state in sorted(self.d.keys()):
             for action in sorted(self.d[state].keys()):
                 l.append(str(state) + ", " + str(action) + " : " + "%3.2f" % self.d[state][action])
-        return "\n".join(l)
\ No newline at end of file
+        return "\n".join(l)
+
+
+class DealerValueAcesEncoder:
+    '''
+    Perfect encoding of DealerValueAcesState, TerminalState and InitialState
+    into indices 0 ... n_states - 1 of a dense table.
+
+    Non-terminal states have a dealer card 1-10, a non-aces value 0-21 and
+    0-4 aces (the value is at most 21, otherwise the state is terminal).
+    '''
+    DEALER_CARDS = 10
+    NON_ACES_VALUES = 22
+    ACES = 5
+    REWARDS = (-1, 0, 1)
+
+    def __init__(self):
+        self.n_playing = self.DEALER_CARDS * self.NON_ACES_VALUES * self.ACES
+        self.terminal_offset = self.n_playing + 1
+        self.initial_index = self.n_playing + len(self.REWARDS)
+        self.n_states = self.initial_index + 1
+
+    def encode(self, state: State) -> int:
+        if isinstance(state, DealerValueAcesState):
+            return ((state.dealer_card.value - 1) * self.NON_ACES_VALUES + state.non_aces_value) * self.ACES \
+                   + state.num_of_aces
+        if isinstance(state, TerminalState):
+            return self.terminal_offset + int(state.reward)
+        if isinstance(state, InitialState):
+            return self.initial_index
+        raise ValueError("State %s cannot be encoded." % state)
+
+    def encode_observation(self, observation, reward, terminal) -> int:
+        '''
+        encode(DealerValueAcesState.from_observation(observation, reward, terminal))
+        without building the state.
+        '''
+        if terminal:
+            return self.terminal_offset + int(reward)
+        dealer_card = min(int(observation.dealer_card), 10)
+        return ((dealer_card - 1) * self.NON_ACES_VALUES + observation.player_non_aces_value) * self.ACES \
+               + observation.player_aces
+
+    def encode_batch(self, dealer_cards, non_aces_values, num_of_aces):
+        '''
+        Vectorized encode of non-terminal states given as arrays of dealer card
+        rank values (1-13), non-aces values and numbers of aces.
+        '''
+        dealer_cards = np.minimum(dealer_cards, 10).astype(np.intp)
+        return ((dealer_cards - 1) * self.NON_ACES_VALUES + non_aces_values) * self.ACES + num_of_aces
+
+    def encode_terminal(self, rewards):
+        '''
+        Vectorized encode of terminal states given their rewards.
+        '''
+        return self.terminal_offset + np.asarray(rewards, dtype=np.intp)
+
+    def decode(self, index: int) -> State:
+        if index < self.n_playing:
+            rest, num_of_aces = divmod(index, self.ACES)
+            dealer_card, non_aces_value = divmod(rest, self.NON_ACES_VALUES)
+            return DealerValueAcesState(Rank(dealer_card + 1), non_aces_value, num_of_aces)
+        if index < self.initial_index:
+            return TerminalState(index - self.terminal_offset)
+        return InitialState()
+
+
+class DenseStateMapping:
+    '''
+    StateMapping backed by a numpy array indexed by an encoder.
+    '''
+    def __init__(self, encoder=None):
+        self.encoder = encoder or DealerValueAcesEncoder()
+        self.values = np.zeros(self.encoder.n_states)
+        self.visited = np.zeros(self.encoder.n_states, dtype=bool)
+
+    def __setitem__(self, key: State, value):
+        index = self.encoder.encode(key)
+        self.values[index] = value
+        self.visited[index] = True
+
+    def __getitem__(self, item: State):
+        index = self.encoder.encode(item)
+        self.visited[index] = True
+        return self.values[index]
+
+    def keys(self):
+        return [self.encoder.decode(index) for index in np.flatnonzero(self.visited)]
+
+    def __str__(self):
+        l = []
+        for key in sorted(self.keys()):
+            l.append(str(key) + " : " + "%3.2f" % self[key])
+        return "\n".join(l)
+
+
+class DenseStateActionMapping:
+    '''
+    StateActionMapping backed by a (n_states, n) numpy array indexed by an encoder.
+    '''
+    def __init__(self, n: int, encoder=None):
+        self.n = n
+        self.encoder = encoder or DealerValueAcesEncoder()
+        self.values = np.zeros((self.encoder.n_states, n))
+        self.visited = np.zeros(self.encoder.n_states, dtype=bool)
+
+    def __setitem__(self, key, value):
+        state, action = key
+        index = self.encoder.encode(state)
+        self.values[index, action] = value
+        self.visited[index] = True
+
+    def __getitem__(self, item):
+        state, action = item
+        index = self.encoder.encode(state)
+        self.visited[index] = True
+        return self.values[index, action]
+
+    def get_action_utility(self, state):
+        index = self.encoder.encode(state)
+        self.visited[index] = True
+        return dict(enumerate(self.values[index]))
+
+    def best_action(self, state):
+        return int(np.argmax(self.values[self.encoder.encode(state)]))
+
+    def argmax(self, indices):
+        '''
+        Greedy actions of many encoded states at once.
+        '''
+        return np.argmax(self.values[indices], axis=1)
+
+    def keys(self):
+        return [self.encoder.decode(index) for index in np.flatnonzero(self.visited)]
+
+    def __str__(self):
+        l = []
+        for state in sorted(self.keys()):
+            for action in range(self.n):
+                l.append(str(state) + ", " + str(action) + " : " + "%3.2f" % self[(state, action)])
+        return "\n".join(l)
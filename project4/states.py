@@ -5,8 +5,13 @@ from numbers import Number
 from blackjack import BlackjackObservation
 from carddeck import *
 
+# Rank by its value, index 0 is unused
+RANKS = (None,) + tuple(Rank)
+
 
 class State(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def __hash__(self):
         pass
@@ -22,6 +27,8 @@ class State(ABC):
 
 
 class InitialState(State):
+    __slots__ = ()
+
     def __hash__(self):
         return hash(0)
 
@@ -42,6 +49,8 @@ class InitialState(State):
 
 
 class TerminalState(State):
+    __slots__ = ('reward',)
+
     def __init__(self, reward: Number):
         self.reward = reward
 
@@ -65,14 +74,35 @@ class TerminalState(State):
 
 
 class ValueAcesState(State):
-    def __init__(self, non_aces_value, num_of_aces):
-        self.non_aces_value = non_aces_value
-        self.num_of_aces = num_of_aces
+    '''
+    Player's non-ace total and number of aces. Instances are interned, so
+    equal states are the same object, and the hash is a perfect packing of
+    both fields.
+    '''
+    __slots__ = ('non_aces_value', 'num_of_aces', '_hash')
+
+    _instances = {}
+
+    def __new__(cls, non_aces_value, num_of_aces):
+        key = (non_aces_value << 3) | num_of_aces
+        state = cls._instances.get(key)
+        if state is None:
+            state = super().__new__(cls)
+            state.non_aces_value = non_aces_value
+            state.num_of_aces = num_of_aces
+            state._hash = key
+            cls._instances[key] = state
+        return state
+
+    def __reduce__(self):
+        return type(self), (self.non_aces_value, self.num_of_aces)
 
     def __hash__(self):
-        return hash(hash(self.non_aces_value) + hash(self.num_of_aces))
+        return self._hash
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if not isinstance(other, ValueAcesState):
             return False
         return self.non_aces_value == other.non_aces_value and self.num_of_aces == other.num_of_aces
@@ -94,26 +124,40 @@ class ValueAcesState(State):
         if terminal:
             return TerminalState.from_observation(observation, reward, terminal)
 
-        num_of_aces, non_aces_value = 0, 0
-        for card in observation.player_hand.cards:
-            if card.rank == Rank.ACE:
-                num_of_aces += 1
-            else:
-                non_aces_value += card.value()
-
-        return ValueAcesState(non_aces_value, num_of_aces)
+        return ValueAcesState(observation.player_non_aces_value, observation.player_aces)
 
 
 class DealerValueAcesState(State):
-    def __init__(self, dealer_card: Rank, non_aces_value, num_of_aces):
-        self.dealer_card = self.transform_card(dealer_card)
-        self.non_aces_value = non_aces_value
-        self.num_of_aces = num_of_aces
+    '''
+    ValueAcesState extended by the dealer's visible card, face cards are
+    merged into ten. Instances are interned and perfectly hashed as well.
+    '''
+    __slots__ = ('dealer_card', 'non_aces_value', 'num_of_aces', '_hash')
+
+    _instances = {}
+
+    def __new__(cls, dealer_card: Rank, non_aces_value, num_of_aces):
+        dealer_card = cls.transform_card(dealer_card)
+        key = (((dealer_card.value << 8) | non_aces_value) << 3) | num_of_aces
+        state = cls._instances.get(key)
+        if state is None:
+            state = super().__new__(cls)
+            state.dealer_card = dealer_card
+            state.non_aces_value = non_aces_value
+            state.num_of_aces = num_of_aces
+            state._hash = key
+            cls._instances[key] = state
+        return state
+
+    def __reduce__(self):
+        return type(self), (self.dealer_card, self.non_aces_value, self.num_of_aces)
 
     def __hash__(self):
-        return hash(hash(self.dealer_card) + hash(self.non_aces_value) + hash(self.num_of_aces))
+        return self._hash
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if not isinstance(other, type(self)):
             return False
         return self.non_aces_value == other.non_aces_value \
@@ -141,17 +185,11 @@ class DealerValueAcesState(State):
         if terminal:
             return TerminalState.from_observation(observation, reward, terminal)
 
-        num_of_aces, non_aces_value = 0, 0
-        for card in observation.player_hand.cards:
-            if card.rank == Rank.ACE:
-                num_of_aces += 1
-            else:
-                non_aces_value += card.value()
-
-        return cls(observation.dealer_hand.cards[0].rank, non_aces_value, num_of_aces)
+        return cls(RANKS[observation.dealer_card], observation.player_non_aces_value, observation.player_aces)
 
-    def transform_card(self, dealer_card):
-        if dealer_card in {Rank.JACK, Rank.KING, Rank.QUEEN, Rank.TEN}:
+    @staticmethod
+    def transform_card(dealer_card):
+        if dealer_card.value > 10:
             return Rank.TEN
         else:
             return dealer_card